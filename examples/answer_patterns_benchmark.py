@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2014 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+
+"""
+Benchmark of the matching of received packets against the reply patterns
+that sent packets are waiting for. 1000 patterns are kept outstanding (TOC
+element and memory read requests) while a stream of log data and console
+packets, that no one is waiting for, is checked against them. The number of
+packets per second that can be checked is printed.
+"""
+
+import sys
+sys.path.append("../lib")
+
+import struct
+import time
+
+from cflib.crazyflie import Crazyflie
+from cflib.crtp.crtpstack import CRTPPacket, CRTPPort
+
+NBR_OF_PATTERNS = 1000
+NBR_OF_PACKETS = 100000
+
+
+def _packet(port, channel, data):
+    pk = CRTPPacket()
+    pk.set_header(port, channel)
+    pk.data = data
+    return pk
+
+
+def _add_patterns(cf):
+    """Add outstanding patterns without sending anything"""
+    for i in range(NBR_OF_PATTERNS / 2):
+        pk = _packet(CRTPPort.PARAM, 0, (0, i & 0xFF))
+        cf._answer_patterns[(pk.header, 0, i & 0xFF, i >> 8)] = None
+        pk = _packet(CRTPPort.MEM, 1, struct.pack("<BIB", 1, i * 20, 20))
+        reply = struct.unpack("<BBBBBB", pk.data)[:-1]
+        cf._answer_patterns[(pk.header,) + reply] = None
+
+
+def _run(cf, packets):
+    start = time.time()
+    for i in xrange(NBR_OF_PACKETS):
+        cf._check_for_answers(packets[i % len(packets)])
+    return NBR_OF_PACKETS / (time.time() - start)
+
+
+if __name__ == '__main__':
+    cf = Crazyflie()
+    _add_patterns(cf)
+
+    log_data = _packet(CRTPPort.LOGGING, 2,
+                       struct.pack("<BBBBfff", 1, 0, 0, 0, 1.0, 2.0, 3.0))
+    console = _packet(CRTPPort.CONSOLE, 0, "Some console text")
+    # A memory read reply for an address no one is waiting for
+    mem_reply = _packet(CRTPPort.MEM, 1,
+                        struct.pack("<BIB", 1, 0xFFFFFF, 0) + "\0" * 20)
+
+    print "%d outstanding patterns" % len(cf._answer_patterns)
+    print "%-30s %12.0f packets/s" % ("Log data",
+                                      _run(cf, [log_data]))
+    print "%-30s %12.0f packets/s" % ("Log data and console",
+                                      _run(cf, [log_data, log_data, console]))
+    print "%-30s %12.0f packets/s" % ("Non-matching memory reply",
+                                      _run(cf, [mem_reply]))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2014 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Logs the stabilizer in batches and prints statistics for each batch. The
+samples of a batch come as one array per variable, which numpy wraps without
+copying. This is much cheaper than a callback per sample at high log rates.
+"""
+
+import sys
+sys.path.append("../lib")
+
+import logging
+import time
+
+import numpy as np
+
+import cflib.crtp
+from cflib.crazyflie.futures import FutureCrazyflie
+from cflib.crazyflie.log import LogConfig
+
+logging.basicConfig(level=logging.ERROR)
+
+
+def batch_received(timestamps, columns, logconf):
+    """Called with the samples of a batch as arrays"""
+    timestamps = np.frombuffer(timestamps, dtype=np.uint32)
+    # The log timestamps are 24 bit milliseconds and wrap around
+    span = (int(timestamps[-1]) - int(timestamps[0])) & 0xFFFFFF
+    print "[{}] {} samples in {} ms".format(timestamps[0], len(timestamps),
+                                            span)
+    for name in sorted(columns.keys()):
+        values = np.frombuffer(columns[name], dtype=np.float32)
+        print "  {:<20} mean {:8.3f} min {:8.3f} max {:8.3f}".format(
+            name, values.mean(), values.min(), values.max())
+
+
+if __name__ == '__main__':
+    uri = "debug://0/0"
+    if len(sys.argv) > 1:
+        uri = sys.argv[1]
+
+    cflib.crtp.init_drivers(enable_debug_driver=True)
+    fcf = FutureCrazyflie()
+    fcf.connect(uri).result(30)
+    print "Connected to {}".format(uri)
+
+    logconf = LogConfig("Stabilizer", 10)
+    logconf.add_variable("stabilizer.roll", "float")
+    logconf.add_variable("stabilizer.pitch", "float")
+    logconf.add_variable("stabilizer.yaw", "float")
+    fcf.cf.log.add_config(logconf)
+    if not logconf.valid:
+        print "Could not add the log configuration"
+    else:
+        # A batch is delivered every 100 samples, or every second if
+        # samples are lost
+        logconf.enable_batching(samples=100, time_in_ms=1000)
+        logconf.data_batch_received_cb.add_callback(batch_received)
+        logconf.start()
+        time.sleep(5)
+        # The samples left in the batch are delivered when stopped
+        logconf.stop()
+
+    fcf.cf.close_link()
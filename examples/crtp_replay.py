@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2014 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Captures the CRTP packets of a session (connection, reading all the
+parameters and logging for a while) and plays the capture back with the
+replay driver, printing how long each step took.
+
+Usage: crtp_replay.py capture <uri> <file>
+       crtp_replay.py replay <file> [<speed factor>|max]
+"""
+
+import sys
+sys.path.append("../lib")
+
+import logging
+import time
+
+import cflib.crtp
+from cflib.crtp.capture import CrtpCapture
+from cflib.crazyflie.futures import FutureCrazyflie
+from cflib.crazyflie.log import LogConfig
+
+logging.basicConfig(level=logging.ERROR)
+
+SAMPLES = 100
+
+
+def _session(fcf, uri):
+    """Run the session and print the times"""
+    start = time.time()
+    fcf.connect(uri).result(60)
+    print "Connected in {:.2f}s".format(time.time() - start)
+
+    start = time.time()
+    values = fcf.param.get_all().result(30)
+    print "Read {} parameters in {:.2f}s".format(len(values),
+                                                time.time() - start)
+
+    logconf = LogConfig("Stabilizer", 10)
+    logconf.add_variable("stabilizer.roll", "float")
+    logconf.add_variable("stabilizer.pitch", "float")
+    start = time.time()
+    with fcf.log.stream(logconf) as stream:
+        for (i, _) in enumerate(stream):
+            if i + 1 == SAMPLES:
+                break
+    print "Got {} log samples in {:.2f}s".format(SAMPLES, time.time() - start)
+
+    fcf.disconnect()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print __doc__
+        sys.exit(1)
+
+    cflib.crtp.init_drivers(enable_debug_driver=True)
+    fcf = FutureCrazyflie()
+
+    if sys.argv[1] == "capture":
+        capture = CrtpCapture(sys.argv[3])
+        capture.start(fcf.cf)
+        _session(fcf, sys.argv[2])
+        capture.stop()
+        print "Captured {} packets".format(capture.nbr_of_packets)
+    else:
+        uri = "replay://{}".format(sys.argv[2])
+        if len(sys.argv) > 3:
+            uri += "?speed={}".format(sys.argv[3])
+        _session(fcf, uri)
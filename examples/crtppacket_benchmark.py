@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2014 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Micro-benchmark of the CRTPPacket class. It measures how many packets per
+second that can be created from the different payload types and how fast the
+payload can be accessed in the different formats used by the library.
+"""
+
+import sys
+sys.path.append("../lib")
+
+import timeit
+
+SETUP = """
+from cflib.crtp.crtpstack import CRTPPacket
+payload_list = range(30)
+payload_tuple = tuple(payload_list)
+payload_str = str(bytearray(payload_list))
+pk = CRTPPacket(0x52, payload_list)
+"""
+
+TESTS = [("Construct from list", "CRTPPacket(0x52, payload_list)"),
+         ("Construct from tuple", "CRTPPacket(0x52, payload_tuple)"),
+         ("Construct from str", "CRTPPacket(0x52, payload_str)"),
+         ("Access data", "pk.data"),
+         ("Access datat", "pk.datat"),
+         ("Access datal", "pk.datal"),
+         ("Access datat[0] and data[1:]", "pk.datat[0]; pk.data[1:]"),
+         ("Set data and access datat", "pk.data = payload_str; pk.datat")]
+
+ITERATIONS = 100000
+
+if __name__ == '__main__':
+    for (name, stmt) in TESTS:
+        t = min(timeit.repeat(stmt, SETUP, number=ITERATIONS, repeat=3))
+        print "%-30s %12.0f packets/s" % (name, ITERATIONS / t)
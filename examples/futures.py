@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2014 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Connects to a Crazyflie with the future based API, reads and sets a
+parameter, reads a memory and prints a few seconds of log data.
+"""
+
+import sys
+sys.path.append("../lib")
+
+import logging
+
+import cflib.crtp
+from cflib.crazyflie.futures import FutureCrazyflie, gather
+from cflib.crazyflie.log import LogConfig
+from cflib.crazyflie.mem import MemoryElement
+
+logging.basicConfig(level=logging.ERROR)
+
+if __name__ == '__main__':
+    uri = "debug://0/0"
+    if len(sys.argv) > 1:
+        uri = sys.argv[1]
+
+    cflib.crtp.init_drivers(enable_debug_driver=True)
+    fcf = FutureCrazyflie()
+    fcf.connect(uri).result(30)
+    print "Connected to {}".format(uri)
+
+    names = sorted(fcf.cf.param.toc.toc.keys())[:1]
+    names = ["{}.{}".format(group, name) for group in names
+             for name in fcf.cf.param.toc.toc[group]]
+    values = gather([fcf.param.get(name) for name in names]).result(5)
+    print "Parameters: {}".format(zip(names, values))
+
+    all_values = fcf.param.get_all().result(10)
+    print "Read all {} parameters".format(len(all_values))
+
+    mems = fcf.cf.mem.get_mems(MemoryElement.TYPE_I2C)
+    if len(mems) > 0:
+        data = fcf.mem.read(mems[0], 0, 16).result(5)
+        print "First bytes of {}: {}".format(mems[0], tuple(bytearray(data)))
+
+    logconf = LogConfig("Stabilizer", 10)
+    logconf.add_variable("stabilizer.roll", "float")
+    logconf.add_variable("stabilizer.pitch", "float")
+    with fcf.log.stream(logconf) as stream:
+        for (i, (timestamp, data)) in enumerate(stream):
+            if i % 20 == 0:
+                print "[{}] {}".format(timestamp, data)
+            if i == 100:
+                break
+    print "Dropped {} samples".format(stream.dropped)
+
+    fcf.disconnect().result()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2014 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+
+"""
+Writes and reads back the I2C memory of the debug driver (FakeMemory) with
+different numbers of chunks in flight and prints the throughput. Use
+debug://0/3 as argument to add random delays to the replies.
+"""
+
+import sys
+sys.path.append("../lib")
+
+import logging
+import random
+from threading import Event
+
+import cflib.crtp
+from cflib.crazyflie import Crazyflie
+from cflib.crazyflie.mem import MemoryElement
+
+logging.basicConfig(level=logging.ERROR)
+
+WINDOWS = [1, 2, 4, 8]
+LENGTH = 2048
+
+
+def _transfer(cf, mem, window):
+    """Write random data and read it back, returns the throughputs"""
+    done = Event()
+    data = tuple([random.randint(0, 255) for i in range(LENGTH)])
+    read_data = []
+
+    cf.mem.mem_write_cb.add_callback(lambda m, addr: done.set())
+    cf.mem.write(mem, 0, data, window=window)
+    done.wait(60)
+    cf.mem.mem_write_cb.callbacks = []
+    done.clear()
+
+    cf.mem.mem_read_cb.add_callback(
+        lambda m, addr, d: (read_data.append(d), done.set()))
+    cf.mem.read(mem, 0, LENGTH, window=window)
+    done.wait(60)
+    cf.mem.mem_read_cb.callbacks = []
+
+    ok = len(read_data) > 0 and tuple(bytearray(read_data[0])) == data
+    return (cf.mem.write_throughput, cf.mem.read_throughput, ok)
+
+
+if __name__ == '__main__':
+    uri = "debug://0/0"
+    if len(sys.argv) > 1:
+        uri = sys.argv[1]
+
+    cflib.crtp.init_drivers(enable_debug_driver=True)
+    cf = Crazyflie()
+    connected = Event()
+    cf.connected.add_callback(lambda link_uri: connected.set())
+    cf.open_link(uri)
+    connected.wait(60)
+
+    mem = cf.mem.get_mems(MemoryElement.TYPE_I2C)[0]
+    print "Transferring %d bytes to/from %s" % (LENGTH, mem)
+    for window in WINDOWS:
+        (write, read, ok) = _transfer(cf, mem, window)
+        print "window %d: write %8.0f bytes/s, read %8.0f bytes/s %s" % (
+            window, write, read, "OK" if ok else "DATA MISMATCH")
+
+    cf.close_link()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2014 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Opens links to several copters on a simulated setup with fewer dongles than
+copters and prints the statistics of each link. The links are opened with
+radio://*/... so that they are spread on the dongles, the dongles are shared
+by time-slicing the radio.
+"""
+
+import sys
+sys.path.append("../lib")
+
+import logging
+import time
+
+import cflib.crtp
+from cflib.crtp import radiomanager
+from cflib.crtp.crtpstack import CRTPPacket
+from cflib.drivers.fakeradio import FakeRadioBackend
+
+logging.basicConfig(level=logging.ERROR)
+
+NBR_OF_DONGLES = 2
+CHANNELS = [10, 20, 30, 40, 50]
+DURATION = 3
+# Packets sent per second to each copter
+RATE = 200
+
+
+if __name__ == '__main__':
+    backend = FakeRadioBackend(nbr_of_dongles=NBR_OF_DONGLES)
+    for channel in CHANNELS:
+        backend.add_copter(channel)
+    radiomanager.set_manager(
+        radiomanager.RadioManager(radio_factory=backend.create_radio))
+
+    cflib.crtp.init_drivers()
+    links = []
+    for channel in CHANNELS:
+        uri = "radio://*/{}/2M".format(channel)
+        links.append((uri, cflib.crtp.get_link_driver(uri)))
+
+    # Keep every link busy with packets that the copters echo back
+    received = dict([(uri, 0) for (uri, _) in links])
+    start = time.time()
+    while time.time() - start < DURATION:
+        for (uri, link) in links:
+            link.send_packet(CRTPPacket(0x30, (1, 2, 3, 4)))
+            while link.receive_packet(0):
+                received[uri] += 1
+        time.sleep(1.0 / RATE)
+
+    for (uri, link) in links:
+        print "{}: {} echoes, {}".format(uri, received[uri],
+                                         link.get_link_stats())
+        print "    latency {}".format(link.get_latency_histogram())
+
+    for (uri, link) in links:
+        link.close()
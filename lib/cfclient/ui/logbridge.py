@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2014 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Bridge for passing log data from the Crazyflie API thread to the UI.
+
+Instead of emitting one Qt signal for every log packet the bridge keeps the
+latest samples for each log configuration and delivers them in the UI thread
+at most a fixed number of times per second, using one queued event for all
+the configurations that got new data.
+"""
+
+__author__ = 'Bitcraze AB'
+__all__ = ['LogBridge']
+
+from collections import deque
+from threading import Lock
+from time import time
+import logging
+import weakref
+
+from PyQt4.QtCore import QObject, QTimer, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of times per second that data is delivered to the UI
+DEFAULT_RATE = 30
+
+
+class _Registration():
+    """UI callbacks and undelivered samples for one log configuration"""
+    def __init__(self, batch_size):
+        self.callbacks = []
+        self.samples = deque(maxlen=batch_size)
+
+
+class LogBridge(QObject):
+    """
+    Delivers log data to callbacks in the UI thread. The callbacks are
+    called with the same arguments as the data_received_cb of the
+    LogConfig.
+    """
+
+    _wakeup_signal = pyqtSignal()
+
+    def __init__(self, rate=DEFAULT_RATE, parent=None):
+        """
+        Initialize the bridge.
+
+        rate - maximum number of deliveries per second
+        """
+        super(LogBridge, self).__init__(parent)
+        self._period = 1.0 / rate
+        self._lock = Lock()
+        self._registrations = weakref.WeakKeyDictionary()
+        self._pending = []
+        self._scheduled = False
+        self._last_delivery = 0
+
+        self._wakeup_signal.connect(self._wakeup)
+
+    def add_callback(self, logconf, cb, batch_size=1):
+        """
+        Register a callback for the data of a log configuration. The
+        callback is called for each sample received since the last delivery,
+        keeping only the batch_size latest ones. With the default batch size
+        only the latest sample is delivered.
+        """
+        with self._lock:
+            reg = self._registrations.get(logconf)
+            if reg is None:
+                reg = _Registration(batch_size)
+                self._registrations[logconf] = reg
+                logconf.data_received_cb.add_callback(self._received)
+            elif batch_size > reg.samples.maxlen:
+                reg.samples = deque(reg.samples, maxlen=batch_size)
+            reg.callbacks.append(cb)
+
+    def remove_callback(self, logconf, cb):
+        """Unregister a callback for the data of a log configuration"""
+        with self._lock:
+            reg = self._registrations.get(logconf)
+            if reg is None or cb not in reg.callbacks:
+                return
+            reg.callbacks.remove(cb)
+            if not reg.callbacks:
+                del self._registrations[logconf]
+                logconf.data_received_cb.remove_callback(self._received)
+
+    def _received(self, timestamp, data, logconf):
+        """Callback from the log layer, called in the Crazyflie API thread"""
+        with self._lock:
+            reg = self._registrations.get(logconf)
+            if reg is None:
+                return
+            if not reg.samples:
+                self._pending.append(reg)
+            reg.samples.append((timestamp, data, logconf))
+            wakeup = not self._scheduled
+            self._scheduled = True
+
+        if wakeup:
+            self._wakeup_signal.emit()
+
+    def _wakeup(self):
+        """Called in the UI thread when new data is waiting, delivers it
+        now or when the next delivery is due"""
+        delay = self._last_delivery + self._period - time()
+        if delay > 0:
+            QTimer.singleShot(int(1000 * delay), self._deliver)
+        else:
+            self._deliver()
+
+    def _deliver(self):
+        """Pass the waiting samples to the callbacks"""
+        with self._lock:
+            batches = [(list(reg.callbacks), list(reg.samples))
+                       for reg in self._pending]
+            for reg in self._pending:
+                reg.samples.clear()
+            self._pending = []
+            self._scheduled = False
+        self._last_delivery = time()
+
+        for (callbacks, samples) in batches:
+            for cb in callbacks:
+                for sample in samples:
+                    cb(*sample)
@@ -52,10 +52,12 @@ from cfclient.utils.input import JoystickReader
 from cfclient.utils.guiconfig import GuiConfig
 from cfclient.utils.logconfigreader import LogConfigReader
 from cfclient.utils.config_manager import ConfigManager
+from cfclient.ui.logbridge import LogBridge
 
 import cfclient.ui.toolboxes
 import cfclient.ui.tabs
 import cflib.crtp
+from cflib.crtp import radiomanager
 
 from cflib.crazyflie.log import Log, LogVariable, LogConfig
 
@@ -87,7 +89,6 @@ class MainUI(QtGui.QMainWindow, main_window_class):
 
     connectionLostSignal = pyqtSignal(str, str)
     connectionInitiatedSignal = pyqtSignal(str)
-    batteryUpdatedSignal = pyqtSignal(int, object, object)
     connectionDoneSignal = pyqtSignal(str)
     connectionFailedSignal = pyqtSignal(str, str)
     disconnectedSignal = pyqtSignal(str)
@@ -140,6 +141,8 @@ class MainUI(QtGui.QMainWindow, main_window_class):
 
         cflib.crtp.init_drivers(enable_debug_driver=GuiConfig()
                                                 .get("enable_debug_driver"))
+        radiomanager.get_manager().set_trust_fw_scan(
+            GuiConfig().get("radio_trust_fw_scan"))
 
         # Create the connection dialogue
         self.connectDialogue = ConnectDialogue()
@@ -177,7 +180,6 @@ class MainUI(QtGui.QMainWindow, main_window_class):
         self.menuItemQuickConnect.triggered.connect(self.quickConnect)
         self.menuItemConfInputDevice.triggered.connect(self.configInputDevice)
         self.menuItemExit.triggered.connect(self.closeAppRequest)
-        self.batteryUpdatedSignal.connect(self.updateBatteryVoltage)
         self._menuitem_rescandevices.triggered.connect(self._rescan_devices)
         self._menuItem_openconfigfolder.triggered.connect(self._open_config_folder)
 
@@ -221,10 +223,14 @@ class MainUI(QtGui.QMainWindow, main_window_class):
         # Parse the log configuration files
         self.logConfigReader = LogConfigReader(self.cf)
 
+        # Shared by all tabs for getting log data in the UI thread
+        self.logBridge = LogBridge()
+
         # Add things to helper so tabs can access it
         cfclient.ui.pluginhelper.cf = self.cf
         cfclient.ui.pluginhelper.inputDeviceReader = self.joystickReader
         cfclient.ui.pluginhelper.logConfigReader = self.logConfigReader
+        cfclient.ui.pluginhelper.logBridge = self.logBridge
 
         self.logConfigDialogue = LogConfigDialogue(cfclient.ui.pluginhelper)
         self._bootloader_dialog = BootloaderDialog(cfclient.ui.pluginhelper)
@@ -370,7 +376,7 @@ class MainUI(QtGui.QMainWindow, main_window_class):
         lg.add_variable("pm.vbat", "float")
         self.cf.log.add_config(lg)
         if lg.valid:
-            lg.data_received_cb.add_callback(self.batteryUpdatedSignal.emit)
+            self.logBridge.add_callback(lg, self.updateBatteryVoltage)
             lg.error_cb.add_callback(self._log_error_signal.emit)
             lg.start()
         else:
@@ -51,7 +51,10 @@ from cflib.crazyflie.param import Param
 
 import pdb
 from datetime import datetime
+from threading import Thread, Lock, Event
+from Queue import Queue, Full, Empty
 import math
+import time
 
 try:
 	import cv2
@@ -74,6 +77,176 @@ PROX_LEFT_THRESHOLD  = int(4095 * 0.6);
 PROX_RIGHT_THRESHOLD = int(4095 * 0.6);
 PROX_FRONT_THRESHOLD = int(4095 * 0.6);
 
+# Color of the letterbox/pillarbox borders around the video
+BORDER_COLOR = [255, 255, 255]
+
+# Frame rate written in the video file. The real capture time of each frame
+# is found in the index file written next to the video.
+RECORDING_FPS = 24
+# Number of frames that can wait for the encoder before frames are dropped
+RECORDING_QUEUE_SIZE = 50
+# How long to wait for the queued frames to be written when the tab is
+# closed, in seconds
+RECORDING_STOP_TIMEOUT = 5
+# How long to wait for the webcam to be released by a stopped capture
+# thread, in seconds
+CAPTURE_STOP_TIMEOUT = 1
+
+class _CaptureThread(Thread):
+	"""Reads frames from the webcam and prepares them for display, keeping
+	only the latest frame"""
+
+	def __init__(self, camera_number):
+		Thread.__init__(self)
+		self.daemon = True
+		self._camera_number = camera_number
+		self._lock = Lock()
+		self._frame = None
+		self._size = None
+		self._running = True
+		self.captured_frames = 0
+		self.recorder = None
+
+	def set_display_size(self, width, height):
+		"""Set the size of the label the frames are shown in"""
+		self._size = (width, height)
+
+	def get_frame(self):
+		"""Return the latest frame as (original BGR frame, RGB frame fitted
+		to the display size) or None if there is no new frame since the last
+		call"""
+		with self._lock:
+			frame = self._frame
+			self._frame = None
+		return frame
+
+	def stop(self):
+		"""Stop capturing, the webcam is released by the thread"""
+		self._running = False
+
+	def _fit(self, frame):
+		"""Add borders to the frame so it has the aspect ratio of the
+		display and convert it to RGB"""
+		frame_height, frame_width, frame_byteValue = frame.shape
+		frame_ratio = float(frame_width) / float(frame_height)
+
+		(label_width, label_height) = self._size
+		label_ratio = float(label_width) / float(max(label_height, 1))
+
+		if label_ratio < frame_ratio: # label is narrower, so add letterbox bars
+			new_height = int(round(frame_width / label_ratio))
+			border_height = int(round((new_height - frame_height) / 2))
+			frame = cv2.copyMakeBorder(frame, border_height, border_height, 0, 0,
+										cv2.BORDER_CONSTANT, value=BORDER_COLOR)
+
+		elif label_ratio > frame_ratio: # wider, so pillarbox
+			new_width = int(round(frame_height * label_ratio))
+			border_width = int(round((new_width - frame_width) / 2))
+			frame = cv2.copyMakeBorder(frame, 0, 0, border_width, border_width,
+										cv2.BORDER_CONSTANT, value=BORDER_COLOR)
+
+		return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+	def run(self):
+		webcam = cv2.VideoCapture(self._camera_number)
+		while self._running:
+			ret, frame = webcam.read()
+			if not ret or frame is None:
+				time.sleep(0.01)
+				continue
+			self.captured_frames += 1
+			recorder = self.recorder
+			if recorder is not None:
+				recorder.add_frame(frame, time.time())
+			if self._size is None:
+				continue
+
+			display_frame = self._fit(frame)
+			with self._lock:
+				self._frame = (frame, display_frame)
+		webcam.release()
+
+class _VideoRecorder(Thread):
+	"""Writes webcam frames to a video file, and for each frame the latest
+	log timestamp from the Crazyflie to an index file"""
+
+	def __init__(self, filename, log_time=None):
+		"""Record to filename (.avi) and the index to filename with the
+		extension .csv. log_time is the latest (log timestamp, receive time)
+		if any."""
+		Thread.__init__(self)
+		self.daemon = True
+		self.filename = filename
+		self.index_filename = os.path.splitext(filename)[0] + ".csv"
+		self._queue = Queue(RECORDING_QUEUE_SIZE)
+		self._stop = Event()
+		self.log_time = log_time
+		self.recorded_frames = 0
+		self.dropped_frames = 0
+
+	def add_frame(self, frame, capture_time):
+		"""Add a frame to the recording, called from the capture thread"""
+		if self._stop.is_set():
+			return
+		try:
+			self._queue.put_nowait((frame, capture_time, self.log_time))
+		except Full:
+			self.dropped_frames += 1
+
+	def stop(self):
+		"""Stop the recording when the queued frames have been written,
+		does not block"""
+		self._stop.set()
+
+	def run(self):
+		try:
+			fourcc = cv2.VideoWriter_fourcc(*"MJPG")
+		except AttributeError:
+			# OpenCV 2.x
+			fourcc = cv2.cv.CV_FOURCC(*"MJPG")
+		writer = None
+		index = open(self.index_filename, "w")
+		index.write("frame,capture_time,log_timestamp,log_received\n")
+
+		while True:
+			try:
+				item = self._queue.get(timeout=0.1)
+			except Empty:
+				# No more frames are added once stopped
+				if self._stop.is_set():
+					break
+				continue
+			(frame, capture_time, log_time) = item
+
+			if writer is None:
+				height, width = frame.shape[:2]
+				writer = cv2.VideoWriter(self.filename, fourcc, RECORDING_FPS,
+										 (width, height))
+				if not writer.isOpened():
+					logger.error("Could not open %s for writing the video, "
+								 "recording stopped", self.filename)
+					self._stop.set()
+					index.close()
+					os.remove(self.index_filename)
+					return
+			writer.write(frame)
+
+			# The time of the Crazyflie when the frame was captured is
+			# log_timestamp + (capture_time - log_received) * 1000
+			if log_time is None:
+				index.write("%d,%.6f,,\n"%(self.recorded_frames, capture_time))
+			else:
+				index.write("%d,%.6f,%d,%.6f\n"%(self.recorded_frames,
+												capture_time, log_time[0],
+												log_time[1]))
+			self.recorded_frames += 1
+
+		if writer is not None:
+			writer.release()
+		index.close()
+		logger.info("Recorded %d frames (%d dropped) to %s",
+					self.recorded_frames, self.dropped_frames, self.filename)
+
 class CameraTab(Tab, camera_tab_class):
 	"""Tab for plotting logging data"""
 
@@ -116,10 +289,19 @@ class CameraTab(Tab, camera_tab_class):
 		# regiser PushButton click event handlers
 		self.button_startstop.clicked.connect(self._button_startstop_clicked)
 		self.button_snapshot.clicked.connect(self._button_snapshot_clicked)
+		self.button_record.clicked.connect(self._button_record_clicked)
 
 		# internal state variables
 		self.webcam = None
+		self._stopped_webcam = None
 		self.capturing = False
+		self.current_frame = None
+		self._recorder = None
+		self._stopped_recorder = None
+		self._log_time = None
+		self._displayed_frames = 0
+		self._captured_frames = 0
+		self._fps_ts = time.time()
 		self.connected = False
 
 		# use a QTimer to redraw the screen when capturing
@@ -153,6 +335,28 @@ class CameraTab(Tab, camera_tab_class):
 
 		self.sonar_text = '0'
 
+		# the recording is finished when the client is closed
+		QtGui.QApplication.instance().aboutToQuit.connect(self._close)
+
+	@pyqtSlot(bool)
+	def toggleVisibility(self, checked):
+		"""Show or hide the tab, the camera is stopped when hidden"""
+		super(CameraTab, self).toggleVisibility(checked)
+		if not checked and self.enabled:
+			self._close()
+
+	def _close(self):
+		"""Stop the camera and wait for the recording to be written"""
+		if self.capturing:
+			self._stop_camera()
+		self._join_stopped_webcam()
+		recorder = self._stopped_recorder
+		self._stopped_recorder = None
+		if recorder is not None:
+			recorder.join(RECORDING_STOP_TIMEOUT)
+			if recorder.is_alive():
+				logger.warning("Recording to %s was not finished",
+							   recorder.filename)
 
 
 	def _button_startstop_clicked(self):
@@ -160,30 +364,56 @@ class CameraTab(Tab, camera_tab_class):
 		if not self.capturing:
 			# open webcam (should always be None when stopped, but do this for error checking)
 			if self.webcam is None:
-				self.webcam = cv2.VideoCapture(int(self.spinbox_webcam_number.value()))
+				# the same webcam can't be opened until the old thread has
+				# released it
+				self._join_stopped_webcam()
+				self.webcam = _CaptureThread(int(self.spinbox_webcam_number.value()))
+				self.webcam.set_display_size(self.label_video.width(),
+											 self.label_video.height())
+				self.webcam.start()
+				self._displayed_frames = 0
+				self._captured_frames = 0
+				self._fps_ts = time.time()
 
 			# update buttons
 			self.button_startstop.setText("Stop Camera")
 			self.button_snapshot.setEnabled(True)
+			self.button_record.setEnabled(True)
 
 			# start capturing
 			#self.timer.start()
 			self.capturing = True
 		else:
-			# stop capturing and release webcam
-			#self.timer.stop()
-			if self.webcam is not None:
-				self.webcam.release()
-				self.webcam = None
+			self._stop_camera()
 
-			# update buttons
-			self.button_startstop.setText("Start Camera")
-			self.button_snapshot.setEnabled(False)
-			self.capturing = False
+	def _stop_camera(self):
+		# stop capturing and release webcam
+		#self.timer.stop()
+		if self._recorder is not None:
+			self._stop_recording()
+		if self.webcam is not None:
+			self.webcam.stop()
+			self._stopped_webcam = self.webcam
+			self.webcam = None
+		self.label_fps.setText("")
+
+		# update buttons
+		self.button_startstop.setText("Start Camera")
+		self.button_snapshot.setEnabled(False)
+		self.button_record.setEnabled(False)
+		self.capturing = False
 
-	def _button_snapshot_clicked(self):
+	def _join_stopped_webcam(self):
+		webcam = self._stopped_webcam
+		self._stopped_webcam = None
+		if webcam is not None:
+			webcam.join(CAPTURE_STOP_TIMEOUT)
+			if webcam.is_alive():
+				logger.warning("The stopped webcam has not been released")
+
+	def _output_path(self, prefix, extension):
 		timestr = str(datetime.now()) # get timestamp to use as filename
-		filename = 'snapshot_' + timestr[:-3].replace(':', '.').replace(' ', '_') + '.jpg'
+		filename = prefix + timestr[:-3].replace(':', '.').replace(' ', '_') + extension
 
 		# check if running from bin dir
 		if os.path.basename(os.getcwd()) == 'bin':
@@ -195,11 +425,32 @@ class CameraTab(Tab, camera_tab_class):
 		if not os.path.isdir(snapshotdir):
 			os.mkdir(snapshotdir)
 
-		filepath = os.path.join(snapshotdir, filename)
+		return os.path.join(snapshotdir, filename)
+
+	def _button_snapshot_clicked(self):
+		filepath = self._output_path('snapshot_', '.jpg')
 		cv2.imwrite(filepath, self.current_frame)
 
 		logger.info("%dx%d Saved snapshot to "%(self.frame_width, self.frame_height) + filepath)
 
+	def _button_record_clicked(self):
+		if self._recorder is None:
+			self._recorder = _VideoRecorder(self._output_path('video_', '.avi'),
+											self._log_time)
+			self._recorder.start()
+			self.webcam.recorder = self._recorder
+			self.button_record.setText("Stop Recording")
+			logger.info("Recording video to %s", self._recorder.filename)
+		else:
+			self._stop_recording()
+
+	def _stop_recording(self):
+		self.webcam.recorder = None
+		self._recorder.stop()
+		self._stopped_recorder = self._recorder
+		self._recorder = None
+		self.button_record.setText("Start Recording")
+
 	def _update_ui(self):
 		for sensor in self._prox_sensors:
 			stylesheet = 'background-color: %s;'%sensor['color']
@@ -207,50 +458,46 @@ class CameraTab(Tab, camera_tab_class):
 			sensor['val_label'].setText(sensor['val_text'])
 		self.label_height_val.setText(self.sonar_text)
 
+		# the recorder stops by itself if the video file can't be written
+		if self._recorder is not None and not self._recorder.is_alive():
+			self._stop_recording()
+
 		self._draw_webcam()
 
 	def _draw_webcam(self):
 		if self.webcam is not None:
-			# read a frame from the webcam, bail if we can't read for some reason
-			ret, self.current_frame = self.webcam.read()
-			if self.current_frame is None:
+			self.webcam.set_display_size(self.label_video.width(),
+										 self.label_video.height())
+			self._update_fps()
+
+			# the frame is captured and converted in the capture thread, bail
+			# if there is no new frame since the last update
+			frame = self.webcam.get_frame()
+			if frame is None:
 				return
 
-			frame_height, frame_width, frame_byteValue = self.current_frame.shape
-			frame_ratio = float(frame_width) / float(frame_height)
-
-			self.frame_height = frame_height
-			self.frame_width = frame_width
-
-			# get current size of the display label
-			label_height = self.label_video.height()
-			label_width = self.label_video.width()
-			label_ratio = float(label_width) / float(label_height)
-
-			if label_ratio < frame_ratio: # label is narrower, so add letterbox bars
-				new_height = int(round(frame_width / label_ratio))
-				border_height = int(round((new_height - frame_height) / 2))
-				
-				# add borders					  input img, top,		   bottom,		left, right
-				border_img = cv2.copyMakeBorder(self.current_frame, border_height, border_height, 0,  0,
-												  # solid border,		 border color
-													cv2.BORDER_CONSTANT, value=[255,255,255])
-
-			elif label_ratio > frame_ratio: # wider, so pillarbox
-				new_width = int(round(frame_height * label_ratio))
-				border_width = int(round((new_width - frame_width) / 2))
-				border_img = cv2.copyMakeBorder(self.current_frame, 0, 0, border_width, border_width,
-													cv2.BORDER_CONSTANT, value=[255,255,255])
-
-			else: # same dimensions, so no border needed
-				border_img = self.current_frame
+			self.current_frame, border_img = frame
+			self.frame_height, self.frame_width = self.current_frame.shape[:2]
 
 			height, width, byteValue = border_img.shape
 			byteValue = byteValue * width
-			cv2.cvtColor(border_img, cv2.COLOR_BGR2RGB, border_img)
 			qimg = QImage(border_img, width, height, byteValue, QImage.Format_RGB888)
 
 			self.label_video.setPixmap(QPixmap.fromImage(qimg))
+			self._displayed_frames += 1
+
+	def _update_fps(self):
+		"""Show the capture and display frame rates once per second"""
+		now = time.time()
+		if now < self._fps_ts + 1.0:
+			return
+		captured = self.webcam.captured_frames - self._captured_frames
+		self._captured_frames = self.webcam.captured_frames
+		self.label_fps.setText("Capture: %.1f fps, display: %.1f fps"%(
+							   captured / (now - self._fps_ts),
+							   self._displayed_frames / (now - self._fps_ts)))
+		self._displayed_frames = 0
+		self._fps_ts = now
 
 
 	def _connected(self, link_uri):
@@ -268,13 +515,22 @@ class CameraTab(Tab, camera_tab_class):
 		# add log config and activate callbacks if successful
 		self._helper.cf.log.add_config(self._log_adc)
 		if self._log_adc.valid:
-			self._log_adc.data_received_cb.add_callback(self._log_adc_data)
+			self._helper.logBridge.add_callback(self._log_adc, self._log_adc_data)
+			# called directly in the API thread to get the timestamp for video
+			# frames with as little delay as possible
+			self._log_adc.data_received_cb.add_callback(self._log_time_received)
 			self._log_adc.error_cb.add_callback(self._log_adc_error)
 			self._log_adc.start()
 		else:
 			logger.warn("CameraTab: Unable to start ADC logging")
 			
 			
+	def _log_time_received(self, timestamp, data, logconf):
+		self._log_time = (timestamp, time.time())
+		recorder = self._recorder
+		if recorder is not None:
+			recorder.log_time = self._log_time
+
 	def _log_adc_error(self, logconf, msg):
 		logger.warn("CameraTab: log error!")
 	
@@ -301,7 +557,7 @@ class CameraTab(Tab, camera_tab_class):
 
 	def _disconnected(self, link_uri):
 		"""Callback for when the Crazyflie has been disconnected"""
-		pass
+		self._log_time = None
 
 		logger.debug("Crazyflie disconnected from {}".format(link_uri))
 
@@ -62,11 +62,6 @@ class FlightTab(Tab, flight_tab_class):
 
     uiSetupReadySignal = pyqtSignal()
 
-    _motor_data_signal = pyqtSignal(int, object, object)
-    _imu_data_signal = pyqtSignal(int, object, object)
-    _althold_data_signal = pyqtSignal(int, object, object)
-    _baro_data_signal = pyqtSignal(int, object, object)
-
     _input_updated_signal = pyqtSignal(float, float, float, float)
     _rp_trim_updated_signal = pyqtSignal(float, float)
     _emergency_stop_updated_signal = pyqtSignal(bool)
@@ -108,10 +103,6 @@ class FlightTab(Tab, flight_tab_class):
         self.helper.inputDeviceReader.althold_updated.add_callback(
                     lambda enabled: self.helper.cf.param.set_value("flightmode.althold", enabled))
 
-        self._imu_data_signal.connect(self._imu_data_received)
-        self._baro_data_signal.connect(self._baro_data_received)
-        self._althold_data_signal.connect(self._althold_data_received)
-        self._motor_data_signal.connect(self._motor_data_received)
 
         self._log_error_signal.connect(self._logging_error)
 
@@ -238,7 +229,7 @@ class FlightTab(Tab, flight_tab_class):
 
         self.helper.cf.log.add_config(lg)
         if (lg.valid):
-            lg.data_received_cb.add_callback(self._imu_data_signal.emit)
+            self.helper.logBridge.add_callback(lg, self._imu_data_received)
             lg.error_cb.add_callback(self._log_error_signal.emit)
             lg.start()
         else:
@@ -254,7 +245,8 @@ class FlightTab(Tab, flight_tab_class):
 
         self.helper.cf.log.add_config(lg)
         if lg.valid:
-            lg.data_received_cb.add_callback(self._motor_data_signal.emit)
+            self.helper.logBridge.add_callback(lg,
+                                               self._motor_data_received)
             lg.error_cb.add_callback(self._log_error_signal.emit)
             lg.start()
         else:
@@ -278,8 +270,8 @@ class FlightTab(Tab, flight_tab_class):
 
                     self.helper.cf.log.add_config(self.logBaro)
                     if self.logBaro.valid:
-                        self.logBaro.data_received_cb.add_callback(
-                            self._baro_data_signal.emit)
+                        self.helper.logBridge.add_callback(
+                            self.logBaro, self._baro_data_received)
                         self.logBaro.error_cb.add_callback(
                             self._log_error_signal.emit)
                         self.logBaro.start()
@@ -291,8 +283,8 @@ class FlightTab(Tab, flight_tab_class):
 
                     self.helper.cf.log.add_config(self.logAltHold)
                     if self.logAltHold.valid:
-                        self.logAltHold.data_received_cb.add_callback(
-                            self._althold_data_signal.emit)
+                        self.helper.logBridge.add_callback(
+                            self.logAltHold, self._althold_data_received)
                         self.logAltHold.error_cb.add_callback(
                             self._log_error_signal.emit)
                         self.logAltHold.start()
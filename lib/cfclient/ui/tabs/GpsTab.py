@@ -72,7 +72,6 @@ gps_tab_class = uic.loadUiType(sys.path[0] +
 class GpsTab(Tab, gps_tab_class):
     """Tab for plotting logging data"""
 
-    _log_data_signal = pyqtSignal(int, object, object)
     _log_error_signal = pyqtSignal(object, str)
 
     _disconnected_signal = pyqtSignal(str)
@@ -129,7 +128,6 @@ class GpsTab(Tab, gps_tab_class):
             #self.gpslayout.addWidget(self._marble)
             self.map_layout.addWidget(self._marble)
             # Connect the signals
-            self._log_data_signal.connect(self._log_data_received)
             self._log_error_signal.connect(self._logging_error)
             self._connected_signal.connect(self._connected)
             self._disconnected_signal.connect(self._disconnected)
@@ -166,7 +164,7 @@ class GpsTab(Tab, gps_tab_class):
         lg.add_variable("gps.fixType")
         self._cf.log.add_config(lg)
         if lg.valid:
-            lg.data_received_cb.add_callback(self._log_data_signal.emit)
+            self.helper.logBridge.add_callback(lg, self._log_data_received)
             lg.error_cb.add_callback(self._log_error_signal.emit)
             lg.start()
         else:
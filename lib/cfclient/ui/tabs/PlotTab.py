@@ -59,6 +59,10 @@ from cfclient.ui.tab import Tab
 plot_tab_class = uic.loadUiType(sys.path[0] +
                                 "/cfclient/ui/tabs/plotTab.ui")[0]
 
+# Number of samples kept between two deliveries of log data to the plot,
+# enough for the fastest log period
+PLOT_BATCH_SIZE = 100
+
 class LogConfigModel(QAbstractItemModel):
     """Model for log configurations in the ComboBox"""
     def __init__(self, parent=None):
@@ -122,7 +126,6 @@ class LogConfigModel(QAbstractItemModel):
 class PlotTab(Tab, plot_tab_class):
     """Tab for plotting logging data"""
 
-    _log_data_signal = pyqtSignal(int, object, object)
     _log_error_signal = pyqtSignal(object, str)
     _disconnected_signal = pyqtSignal(str)
     _connected_signal = pyqtSignal(str)
@@ -145,7 +148,6 @@ class PlotTab(Tab, plot_tab_class):
 
         self._model = LogConfigModel()
         self.dataSelector.setModel(self._model)
-        self._log_data_signal.connect(self._log_data_received)
         self.tabWidget = tabWidget
         self.helper = helper
         self.plotLayout.addWidget(self._plot)
@@ -179,14 +181,6 @@ class PlotTab(Tab, plot_tab_class):
         self._previous_config = None
         self._started_previous = False
 
-    def _log_data_signal_wrapper(self, ts, data, logconf):
-        """Wrapper for signal"""
-
-        # For some reason the *.emit functions are not
-        # the same over time (?!) so they cannot be registered and then
-        # removed as callbacks.
-        self._log_data_signal.emit(ts, data, logconf)
-
     def _log_error_signal_wrapper(self, config, msg):
         """Wrapper for signal"""
 
@@ -209,8 +203,8 @@ class PlotTab(Tab, plot_tab_class):
 
         # Remove our callback for the previous config
         if self._previous_config:
-            self._previous_config.data_received_cb.remove_callback(
-                self._log_data_signal_wrapper)
+            self.helper.logBridge.remove_callback(self._previous_config,
+                                                  self._log_data_received)
             self._previous_config.error_cb.remove_callback(
                 self._log_error_signal_wrapper)
 
@@ -230,7 +224,9 @@ class PlotTab(Tab, plot_tab_class):
             self._plot.add_curve(d.name,
                                 self.colors[color_selector % len(self.colors)])
             color_selector += 1
-        lg.data_received_cb.add_callback(self._log_data_signal_wrapper)
+        # The plot needs every sample, not only the latest one
+        self.helper.logBridge.add_callback(lg, self._log_data_received,
+                                           batch_size=PLOT_BATCH_SIZE)
         lg.error_cb.add_callback(self._log_error_signal_wrapper)
 
         self._previous_config = lg
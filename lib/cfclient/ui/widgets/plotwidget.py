@@ -83,12 +83,21 @@ try:
 except Exception:
     pass
 
+# Number of samples kept for each curve, older samples are overwritten
+CURVE_CAPACITY = 10000
+
+
 class PlotItemWrapper:
     """Wrapper for PlotDataItem to handle what data is shown"""
-    def __init__(self, curve):
+    def __init__(self, curve, capacity=CURVE_CAPACITY):
         """Initialize"""
-        self.data = []
-        self.ts = []
+        # Every point is written twice, at index and index + capacity, so
+        # that the last capacity points are always available as one
+        # contiguous slice of the buffers.
+        self._capacity = capacity
+        self._data = np.zeros(2 * capacity)
+        self._ts = np.zeros(2 * capacity)
+        self._count = 0
         self.curve = curve
 
     def add_point(self, p, ts):
@@ -98,26 +107,69 @@ class PlotItemWrapper:
         p - point
         ts - timestamp in ms
         """
-        self.data.append(p)
-        self.ts.append(ts)
+        i = self._count % self._capacity
+        self._data[i] = self._data[i + self._capacity] = p
+        self._ts[i] = self._ts[i + self._capacity] = ts
+        self._count += 1
+
+    def _window(self, start, stop):
+        """Return views of the data and timestamps for the sample numbers
+        start to stop, limited to the samples still in the buffer"""
+        start = max(start, self._count - self._capacity, 0)
+        stop = min(stop, self._count)
+        if stop <= start:
+            return (self._data[0:0], self._ts[0:0])
+        i = start % self._capacity
+        return (self._data[i:i + stop - start], self._ts[i:i + stop - start])
+
+    def show_data(self, start, stop, width=0):
+        """Set what data should be shown from the curve. This is done to keep
+        performance when many points have been added. If width (in pixels) is
+        set and there are more than two points per pixel, the data is
+        decimated to the min and max value for each pixel."""
+        (data, ts) = self._window(start, stop)
+        if len(data) == 0:
+            return [0, 0]
+
+        if width > 0 and len(data) > 2 * width:
+            per_bin = len(data) // width
+            nbr_of_bins = len(data) // per_bin
+            end = nbr_of_bins * per_bin
+            bins = data[:end].reshape(nbr_of_bins, per_bin)
+            y = np.empty(2 * nbr_of_bins)
+            y[0::2] = bins.min(axis=1)
+            y[1::2] = bins.max(axis=1)
+            x = np.repeat(ts[:end:per_bin], 2)
+            # Keep the last samples that did not fill a complete bin
+            y = np.concatenate((y, data[end:]))
+            x = np.concatenate((x, ts[end:]))
+            self.curve.setData(y=y, x=x)
+        else:
+            self.curve.setData(y=data, x=ts)
+
+        return [ts[0], ts[-1]]
 
-    def show_data(self, start, stop):
-        """Set what data should be shown from the curve. This is done to keep performance when many
-        points have been added."""
-        limit = min(stop, len(self.data))
-        self.curve.setData(y=self.data[start:limit], x=self.ts[start:limit])
-        return [self.ts[start], self.ts[limit-1]]
 
 class PlotWidget(QtGui.QWidget, plot_widget_class):
     """Wrapper widget for PyQtGraph adding some extra buttons"""
 
+    # Emitted once per second with the number of frames drawn, the number
+    # of frames dropped and the average render time in ms
+    renderStatsUpdated = pyqtSignal(int, int, float)
+
     def __init__(self, parent=None, fps=100, title="", *args):
         super(PlotWidget, self).__init__(*args)
         self.setupUi(self)
 
-        # Limit the plot update to 10Hz
-        self._ts = time()
-        self._delay = 0.1
+        # Samples are only buffered when they arrive, the plot is redrawn
+        # from a timer at most fps times per second
+        self._frame_period = 1.0 / fps
+        self._dirty = False
+        self._last_frame = None
+        self._frames = 0
+        self._dropped_frames = 0
+        self._render_time = 0.0
+        self._stats_ts = time()
 
         # Check if we could import PyQtGraph, if not then stop here
         if not _pyqtgraph_found:
@@ -181,6 +233,10 @@ class PlotWidget(QtGui.QWidget, plot_widget_class):
         self._draw_graph = True
         self._auto_redraw.stateChanged.connect(self._auto_redraw_change)
 
+        self._redraw_timer = QTimer(self)
+        self._redraw_timer.timeout.connect(self._redraw)
+        self._redraw_timer.start(int(1000 * self._frame_period))
+
     def _auto_redraw_change(self, state):
         """Callback from the auto redraw checkbox"""
         if state == 0:
@@ -259,6 +315,40 @@ class PlotWidget(QtGui.QWidget, plot_widget_class):
             self._dtime = ts - self._last_ts
             self._last_ts = ts
 
+        for name in self._items:
+            self._items[name].add_point(data[name], ts)
+        self._last_item = self._last_item + 1
+        self._dirty = True
+
+    def _redraw(self):
+        """Callback from the redraw timer, draws the data added since the
+        last frame"""
+        now = time()
+        if self._last_frame is not None:
+            # The timer is late if the GUI thread was busy, count the frames
+            # that should have been drawn in the mean time as dropped
+            late = int((now - self._last_frame) / self._frame_period) - 1
+            self._dropped_frames += max(late, 0)
+        self._last_frame = now
+
+        if self._dirty and self._draw_graph:
+            self._dirty = False
+            self._draw_frame()
+            self._frames += 1
+            self._render_time += time() - now
+
+        if now > self._stats_ts + 1.0:
+            (frames, dropped, render_time) = self.get_render_stats()
+            self.renderStatsUpdated.emit(frames, dropped, render_time)
+            logger.debug("Plot drew %d frames (%d dropped), %.1f ms/frame",
+                         frames, dropped, render_time)
+            self._frames = 0
+            self._dropped_frames = 0
+            self._render_time = 0.0
+            self._stats_ts = now
+
+    def _draw_frame(self):
+        """Update the curves and the range of the plot"""
         x_min_limit = 0
         x_max_limit = 0
         # We are adding new datasets, calculate what we should show.
@@ -266,18 +356,25 @@ class PlotWidget(QtGui.QWidget, plot_widget_class):
             x_min_limit = max(0, self._last_item-self._nbr_samples)
             x_max_limit = max(self._last_item, self._nbr_samples)
 
+        width = int(self._plot_widget.getViewBox().width())
         for name in self._items:
-            self._items[name].add_point(data[name], ts)
-            if self._draw_graph and time() > self._ts + self._delay:
-                [self._x_min, self._x_max] = self._items[name].show_data(x_min_limit, x_max_limit)
-        if time() > self._ts + self._delay:
-            self._ts = time()
+            [self._x_min, self._x_max] = self._items[name].show_data(
+                                            x_min_limit, x_max_limit, width)
         if self._enable_samples_x.isChecked() and self._dtime and self._last_item < self._nbr_samples:
             self._x_max = self._x_min + self._nbr_samples * self._dtime
 
-        self._last_item = self._last_item + 1
         self._plot_widget.getViewBox().setRange(xRange=(self._x_min, self._x_max))
 
+    def get_render_stats(self):
+        """
+        Return the rendering statistics since they were last reported as
+        (frames drawn, frames dropped, average render time in ms).
+        """
+        render_time = 0.0
+        if self._frames > 0:
+            render_time = 1000 * self._render_time / self._frames
+        return (self._frames, self._dropped_frames, render_time)
+
     def removeAllDatasets(self):
         """Reset the plot by removing all the datasets"""
         for item in self._items:
@@ -287,5 +384,6 @@ class PlotWidget(QtGui.QWidget, plot_widget_class):
         self._last_item = 0
         self._last_ts = None
         self._dtime = None
+        self._dirty = False
         self._plot_widget.clear()
 
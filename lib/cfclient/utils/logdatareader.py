@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2013 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+"""
+Used to read recorded log data.
+
+A recording (see logdatawriter) is memory-mapped and its columns are NumPy
+arrays backed by the file, so only the parts that are used are read from
+the disk. A session is a directory with the recordings of one connection,
+the recordings are opened when they are first used.
+"""
+
+__author__ = 'Bitcraze AB'
+__all__ = ['LogRecording', 'LogSession']
+
+import os
+import glob
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+from cflib.crazyflie.log import LogTocElement
+from .logdatawriter import read_header, FILE_EXTENSION
+
+try:
+    import numpy as np
+    _numpy_found = True
+except Exception:
+    _numpy_found = False
+
+# NumPy types for the unpack strings of the log TOC types
+_NUMPY_TYPES = {'B': '<u1', 'H': '<u2', 'L': '<u4', 'b': '<i1', 'h': '<i2',
+                'i': '<i4', 'f': '<f4'}
+
+# The timestamps of the Crazyflie are 24 bits and wrap around
+_TIMESTAMP_WRAP = 1 << 24
+
+
+class LogRecording():
+    """
+    A memory-mapped recording of a log block. The values of a variable are
+    accessed by name (recording["stabilizer.roll"]), as are the timestamps
+    of the Crazyflie in ms ("timestamp") and the time the samples were
+    received in seconds since epoch ("received").
+    """
+
+    def __init__(self, filename):
+        if not _numpy_found:
+            raise Exception("NumPy is needed to read log recordings")
+        self.filename = filename
+        with open(filename, "rb") as f:
+            header = read_header(f)
+        self.header = header
+        self.name = header.name
+        self.variables = [name for (name, _) in header.variables]
+        self.start_time = header.start_time
+
+        dtype = np.dtype([("timestamp", "<u4"), ("received", "<f8")] +
+                         [(name, _NUMPY_TYPES[
+                             LogTocElement.get_unpack_string_from_id(
+                                 ident)[1:]])
+                          for (name, ident) in header.variables])
+        # A record that is being written when the file is opened is left out
+        nbr_of_records = ((os.path.getsize(filename) - header.size) /
+                          dtype.itemsize)
+        if nbr_of_records > 0:
+            self._data = np.memmap(filename, dtype=dtype, mode="r",
+                                   offset=header.size,
+                                   shape=(nbr_of_records,))
+        else:
+            self._data = np.zeros(0, dtype=dtype)
+        self._index = None
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, name):
+        return self._data[name]
+
+    def __contains__(self, name):
+        return name in self._data.dtype.names
+
+    @property
+    def records(self):
+        """All the records as a NumPy structured array"""
+        return self._data
+
+    @property
+    def timestamps(self):
+        """The timestamps of the Crazyflie in ms, without the wrap around
+        of the 24 bit timestamps of the Crazyflie"""
+        if self._index is None:
+            timestamps = self._data["timestamp"].astype(np.int64)
+            wraps = np.zeros(len(timestamps), dtype=np.int64)
+            if len(timestamps) > 1:
+                wraps[1:] = np.cumsum(np.diff(timestamps) < 0)
+            self._index = timestamps + wraps * _TIMESTAMP_WRAP
+        return self._index
+
+    def time_range(self, start=None, stop=None, received=False):
+        """Get the records with start <= timestamp < stop as a NumPy
+        structured array backed by the file. The times are timestamps of
+        the Crazyflie in ms, or receive times in seconds since epoch if
+        received is True. None means from the first or to the last
+        record."""
+        (first, last) = self._range_indexes(start, stop, received)
+        return self._data[first:last]
+
+    def column(self, name, start=None, stop=None, received=False):
+        """Get the values of a variable and their timestamps in a time
+        range as (timestamps, values), see time_range"""
+        (first, last) = self._range_indexes(start, stop, received)
+        if received:
+            timestamps = self._data["received"][first:last]
+        else:
+            timestamps = self.timestamps[first:last]
+        return (timestamps, self._data[name][first:last])
+
+    def _range_indexes(self, start, stop, received):
+        if received:
+            index = self._data["received"]
+        else:
+            index = self.timestamps
+        first = 0
+        last = len(index)
+        if start is not None:
+            first = np.searchsorted(index, start, side="left")
+        if stop is not None:
+            last = np.searchsorted(index, stop, side="left")
+        return (first, last)
+
+    def __str__(self):
+        return "{} ({} records of {})".format(self.name, len(self),
+                                              ", ".join(self.variables))
+
+
+class LogSession():
+    """
+    The recordings of a session, the directory written for one connection.
+    Only the headers are read when the session is opened, the recordings
+    are mapped when they are first used.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        # Block name -> list of (start time, filename)
+        self._files = {}
+        # Variable name -> set of block names
+        self._variables = {}
+        self._recordings = {}
+
+        for filename in glob.glob(os.path.join(directory,
+                                               "*." + FILE_EXTENSION)):
+            try:
+                with open(filename, "rb") as f:
+                    header = read_header(f)
+            except Exception as e:
+                logger.warning("Could not read %s: %s", filename, e)
+                continue
+            self._files.setdefault(header.name, []).append(
+                (header.start_time, filename))
+            for (name, _) in header.variables:
+                self._variables.setdefault(name, set()).add(header.name)
+
+        for files in self._files.values():
+            files.sort()
+
+    @property
+    def blocks(self):
+        """The names of the recorded blocks"""
+        return sorted(self._files.keys())
+
+    @property
+    def variables(self):
+        """The names of the recorded variables"""
+        return sorted(self._variables.keys())
+
+    def recordings(self, block):
+        """Get the recordings of a block in the order they were started"""
+        return [self._open(filename) for (_, filename) in self._files[block]]
+
+    def find(self, variable):
+        """Get the recordings that contain a variable"""
+        found = []
+        for block in sorted(self._variables.get(variable, ())):
+            found += self.recordings(block)
+        return found
+
+    def column(self, variable, start=None, stop=None, received=False):
+        """Get the values of a variable in a time range as (timestamps,
+        values). The values are backed by the file if they come from one
+        recording, if the variable is in several recordings they are merged
+        in time order in one array. The Crazyflie timestamps of all the
+        recordings are then counted from the wrap around of the first
+        recording. See LogRecording.time_range for the time range."""
+        recordings = self.find(variable)
+        if len(recordings) == 0:
+            raise KeyError(variable)
+        if len(recordings) == 1:
+            return recordings[0].column(variable, start, stop, received)
+
+        reference = _first_recording(recordings)
+        columns = []
+        for recording in recordings:
+            if received:
+                timestamps = recording["received"]
+            else:
+                timestamps = (recording.timestamps +
+                              _wrap_offset(recording, reference))
+            first = 0
+            last = len(timestamps)
+            if start is not None:
+                first = np.searchsorted(timestamps, start, side="left")
+            if stop is not None:
+                last = np.searchsorted(timestamps, stop, side="left")
+            columns.append((timestamps[first:last],
+                            recording[variable][first:last]))
+
+        timestamps = np.concatenate([t for (t, _) in columns])
+        values = np.concatenate([v for (_, v) in columns])
+        order = np.argsort(timestamps, kind="mergesort")
+        return (timestamps[order], values[order])
+
+    def _open(self, filename):
+        if filename not in self._recordings:
+            self._recordings[filename] = LogRecording(filename)
+        return self._recordings[filename]
+
+
+def _first_recording(recordings):
+    """The recording with the first received record"""
+    first = None
+    for recording in recordings:
+        if len(recording) > 0 and (first is None or
+                                   recording["received"][0] <
+                                   first["received"][0]):
+            first = recording
+    return first
+
+
+def _wrap_offset(recording, reference):
+    """Get what to add to the unwrapped timestamps of the recording to
+    count them from the same wrap around as the ones of the reference. The
+    number of wrap arounds between the two is found with the receive
+    times."""
+    if reference is None or len(recording) == 0:
+        return 0
+    expected = (reference.timestamps[0] +
+                (recording["received"][0] - reference["received"][0]) * 1000)
+    wraps = round((expected - recording.timestamps[0]) / _TIMESTAMP_WRAP)
+    return int(wraps) * _TIMESTAMP_WRAP
@@ -28,22 +28,128 @@
 
 """
 Used to write log data to files.
+
+The samples of a log block are recorded in a binary file made of a header
+followed by fixed size records. The header describes the block:
+
+  magic "CFLOG", format version (B), start time (<d, seconds since epoch),
+  block period in ms (<H), number of variables (B) and the block name,
+  then for each variable its type id in the log TOC (B) and its name.
+  The names are prefixed with their length (B).
+
+Each record holds the timestamp of the Crazyflie in ms (<I), the time the
+sample was received in seconds since epoch (<d) and the values of the
+variables in the order of the header, with the types of the log TOC. Use
+convert_to_csv to get a CSV file from a recording.
 """
 
 __author__ = 'Bitcraze AB'
-__all__ = ['LogWriter']
+__all__ = ['LogWriter', 'LogFileHeader', 'read_header', 'convert_to_csv']
 
 import os
 import sys
 import datetime
+import collections
+import struct
+import time
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-from cflib.crazyflie.log import LogConfig
-
-import traceback
+from cflib.crazyflie.log import LogTocElement
+from cflib.utils.filewriter import FileWriterThread
+
+MAGIC = "CFLOG"
+VERSION = 1
+FILE_EXTENSION = "cflog"
+
+_HEADER = struct.Struct("<5sBdHB")
+_RECORD_HEADER = "<Id"
+
+# How often the buffered records are written to the file, in seconds
+FLUSH_PERIOD = 0.5
+
+
+class LogFileHeader():
+    """The description of a recorded log block"""
+
+    def __init__(self, name, period_in_ms, variables, start_time):
+        self.name = name
+        self.period_in_ms = period_in_ms
+        # List of (name, type id in the log TOC)
+        self.variables = variables
+        self.start_time = start_time
+        self.record = struct.Struct(_RECORD_HEADER + "".join(
+            [LogTocElement.get_unpack_string_from_id(ident)[1:]
+             for (_, ident) in variables]))
+        # Size of the header in the file
+        self.size = 0
+
+    def pack(self):
+        data = _HEADER.pack(MAGIC, VERSION, self.start_time,
+                            self.period_in_ms, len(self.variables))
+        data += _pack_string(self.name)
+        for (name, ident) in self.variables:
+            data += struct.pack("<B", ident) + _pack_string(name)
+        return data
+
+
+def _pack_string(string):
+    return struct.pack("<B", len(string)) + string
+
+
+def _read_string(f):
+    length = ord(f.read(1))
+    return f.read(length)
+
+
+def read_header(f):
+    """Read the header of a recording from the file object f, returns a
+    LogFileHeader and leaves f at the first record"""
+    start = f.tell()
+    (magic, version, start_time, period, nbr_of_vars) = _HEADER.unpack(
+        f.read(_HEADER.size))
+    if magic != MAGIC:
+        raise Exception("Not a log recording")
+    if version != VERSION:
+        raise Exception("Unsupported log recording version {}"
+                        .format(version))
+    name = _read_string(f)
+    variables = []
+    for _ in range(nbr_of_vars):
+        ident = ord(f.read(1))
+        variables.append((_read_string(f), ident))
+    header = LogFileHeader(name, period, variables, start_time)
+    header.size = f.tell() - start
+    return header
+
+
+def convert_to_csv(filename, csv_filename=None):
+    """Convert a recording to a CSV file with the timestamp and the values
+    of the variables, returns the name of the CSV file"""
+    if csv_filename is None:
+        csv_filename = os.path.splitext(filename)[0] + ".csv"
+    with open(filename, "rb") as f:
+        header = read_header(f)
+        record = header.record
+        with open(csv_filename, "w") as csv:
+            csv.write(",".join(["Timestamp"] +
+                               [name for (name, _) in header.variables]))
+            csv.write("\n")
+            line = ",".join(["%d"] + ["%r"] * len(header.variables)) + "\n"
+            while True:
+                data = f.read(record.size * 1024)
+                if len(data) < record.size:
+                    break
+                nbr_of_records = len(data) / record.size
+                lines = []
+                for i in xrange(nbr_of_records):
+                    values = record.unpack_from(data, i * record.size)
+                    # The receive time is not part of the CSV
+                    lines.append(line % ((values[0],) + values[2:]))
+                csv.write("".join(lines))
+    return csv_filename
 
 
 class LogWriter():
@@ -58,44 +164,36 @@ class LogWriter():
         self._dir = os.path.join(sys.path[1], "logdata",
                                  connected_ts.strftime("%Y%m%dT%H-%M-%S"))
         self._file = None
-        self._header_written = False
-        self._header_values = []
         self._filename = None
+        self._record = None
+        self._records = collections.deque()
+        self._thread = None
 
-    def _write_header(self):
-        """Write the header to the file"""
-        if not self._header_written:
-            s = "Timestamp"
-            for v in self._block.variables:
-                s += "," + v.name
-                self._header_values.append(v.name)
-            s += '\n'
-            self._file.write(s)
-            self._header_written = True
-
-    def _new_data(self, timestamp, data, logconf):
-        """Callback when new data arrives from the Crazyflie"""
-        if self._file:
-            s = "%d" % timestamp
-            for col in self._header_values:
-                s += "," + str(data[col])
-            s += '\n'
-            self._file.write(s)
+    def _new_data(self, timestamp, values, logconf):
+        """Callback when new data arrives from the Crazyflie, the record is
+        written to the file by the writer thread"""
+        self._records.append(self._record.pack(timestamp, time.time(),
+                                               *values))
 
     def writing(self):
         """Return True if the file is open and we are using it,
         otherwise false"""
         return True if self._file else False
 
+    def get_filename(self):
+        """Return the name of the file being written, None if not writing"""
+        return self._filename if self._file else None
+
     def stop(self):
         """Stop the logging to file"""
         if self._file:
+            self._block.data_received_tuple_cb.remove_callback(self._new_data)
+            self._thread.stop()
+            self._thread = None
             self._file.close()
             self._file = None
-            self._block.data_received_cb.remove_callback(self._new_data)
             logger.info("Stopped logging of block [%s] to file [%s]",
                         self._block.name, self._filename)
-            self._header_values = []
 
     def start(self):
         """Start the logging to file"""
@@ -108,12 +206,23 @@ class LogWriter():
 
         if not self._file:
             time_now = datetime.datetime.now()
-            name = "{0}-{1}.csv".format(self._block.name,
+            name = "{0}-{1}.{2}".format(self._block.name,
                                         time_now.strftime(
-                                            "%Y%m%dT%H-%M-%S"))
+                                            "%Y%m%dT%H-%M-%S"),
+                                        FILE_EXTENSION)
             self._filename = os.path.join(self._dir, name)
-            self._file = open(self._filename, 'w')
-            self._write_header()
-            self._block.data_received_cb.add_callback(self._new_data)
+            self._file = open(self._filename, 'wb')
+            header = LogFileHeader(self._block.name,
+                                   self._block.period_in_ms,
+                                   [(v.name, v.fetch_as)
+                                    for v in self._block.variables],
+                                   time.time())
+            self._file.write(header.pack())
+            self._record = header.record
+            self._records.clear()
+            self._thread = FileWriterThread(self._file, self._records,
+                                            FLUSH_PERIOD)
+            self._thread.start()
+            self._block.data_received_tuple_cb.add_callback(self._new_data)
             logger.info("Started logging of block [%s] to file [%s]",
-                        self._block.name, self._filename)
\ No newline at end of file
+                        self._block.name, self._filename)
@@ -42,9 +42,10 @@ import logging
 logger = logging.getLogger(__name__)
 import time
 import datetime
+import heapq
 from threading import Thread
 
-from threading import Timer, Lock
+from threading import Lock, Condition
 
 from .commander import Commander
 from .console import Console
@@ -92,21 +93,29 @@ class Crazyflie():
 
     state = State.DISCONNECTED
 
-    def __init__(self, link=None, ro_cache=None, rw_cache=None):
+    def __init__(self, link=None, ro_cache=None, rw_cache=None,
+                 packed_cache=False):
         """
         Create the objects from this module and register callbacks.
 
         ro_cache -- Path to read-only cache (string)
         rw_cache -- Path to read-write cache (string)
+        packed_cache -- Store new TOCs in a single file in the read-write
+                        cache instead of one JSON file per TOC
         """
         self.link = link
         self._toc_cache = TocCache(ro_cache=ro_cache,
-                                   rw_cache=rw_cache)
+                                   rw_cache=rw_cache,
+                                   packed=packed_cache)
 
         self.incoming = _IncomingPacketHandler(self)
         self.incoming.setDaemon(True)
         self.incoming.start()
 
+        self._resend_scheduler = _ResendScheduler()
+        self._resend_scheduler.setDaemon(True)
+        self._resend_scheduler.start()
+
         self.commander = Commander(self)
         self.log = Log(self)
         self.console = Console(self)
@@ -120,7 +129,7 @@ class Crazyflie():
         self.packet_received.add_callback(self._check_for_initial_packet_cb)
         self.packet_received.add_callback(self._check_for_answers)
 
-        self._answer_patterns = {}
+        self._answer_patterns = _AnswerPatterns()
 
         self._send_lock = Lock()
 
@@ -246,7 +255,7 @@ class Crazyflie():
         if (self.link is not None):
             self.link.close()
             self.link = None
-        self._answer_patterns = {}
+        self._cancel_all_resends()
         self.disconnected.call(self.link_uri)
 
     def add_port_callback(self, port, cb):
@@ -257,11 +266,19 @@ class Crazyflie():
         """Remove the callback cb on port"""
         self.incoming.remove_port_callback(port, cb)
 
-    def _no_answer_do_retry(self, pk, pattern):
+    def _no_answer_do_retry(self, pk, pattern, timeout):
         """Resend packets that we have not gotten answers to"""
         logger.debug("Resending for pattern %s", pattern)
-        # Set the timer to None before trying to send again
-        self.send_packet(pk, expected_reply=pattern, resend=True)
+        self.send_packet(pk, expected_reply=pattern, resend=True,
+                         timeout=timeout)
+
+    def _cancel_all_resends(self):
+        """Cancel the resending of all packets still waiting for answers"""
+        self._send_lock.acquire()
+        for resend in self._answer_patterns.values():
+            self._resend_scheduler.cancel(resend)
+        self._answer_patterns.clear()
+        self._send_lock.release()
 
     def _check_for_answers(self, pk):
         """
@@ -269,64 +286,208 @@ class Crazyflie():
         waiting for an answer on this port. If so, then cancel the retry
         timer.
         """
-        longest_match = ()
-        if len(self._answer_patterns) > 0:
-            data = (pk.header,) + pk.datat
-            for p in self._answer_patterns.keys():
-                logger.debug("Looking for pattern match on %s vs %s", p, data)
-                if len(p) <= len(data):
-                    if p == data[0:len(p)]:
-                        match = data[0:len(p)]
-                        if len(match) >= len(longest_match):
-                            logger.debug("Found new longest match %s", match)
-                            longest_match = match
-        if len(longest_match) > 0:
-            del self._answer_patterns[longest_match]
+        resend = self._answer_patterns.pop_longest_match(pk.header,
+                                                         pk.datat)
+        self._resend_scheduler.cancel(resend)
 
     def send_packet(self, pk, expected_reply=(), resend=False, timeout=0.2):
         """
         Send a packet through the link interface.
 
         pk -- Packet to send
-        expect_answer -- True if a packet from the Crazyflie is expected to
-                         be sent back, otherwise false
+        expected_reply -- Pattern (starting after the header) of the packet
+                          the Crazyflie is expected to send back. The packet
+                          is resent until a matching packet is received
+        timeout -- Time in seconds to wait for the reply before resending
 
         """
         self._send_lock.acquire()
         if (self.link is not None):
-            self.link.send_packet(pk)
+            # Called before sending so that the packet is seen before the
+            # reply from the Crazyflie
             self.packet_sent.call(pk)
+            self.link.send_packet(pk)
             if len(expected_reply) > 0 and not resend:
                 pattern = (pk.header,) + expected_reply
                 logger.debug("Sending packet and expecting the %s pattern back",
                              pattern)
-                new_timer = Timer(0.2,
-                                  lambda: self._no_answer_do_retry(pk, pattern))
-                self._answer_patterns[pattern] = new_timer
-                new_timer.start()
+                self._resend_scheduler.cancel(
+                    self._answer_patterns.get(pattern))
+                self._answer_patterns[pattern] = \
+                    self._resend_scheduler.schedule(
+                        timeout,
+                        lambda: self._no_answer_do_retry(pk, pattern,
+                                                         timeout))
             elif resend:
                 # Check if we have gotten an answer, if not try again
                 pattern = expected_reply
                 if pattern in self._answer_patterns:
                     logger.debug("We want to resend and the pattern is there")
-                    if self._answer_patterns[pattern]:
-                        new_timer = Timer(0.2,
-                                          lambda:
-                                          self._no_answer_do_retry(
-                                              pk, pattern))
-                        self._answer_patterns[pattern] = new_timer
-                        new_timer.start()
+                    self._answer_patterns[pattern] = \
+                        self._resend_scheduler.schedule(
+                            timeout,
+                            lambda: self._no_answer_do_retry(pk, pattern,
+                                                             timeout))
                 else:
                     logger.debug("Resend requested, but no pattern found: %s",
                                  self._answer_patterns)
         self._send_lock.release()
 
+
+class _AnswerPatterns(object):
+    """
+    The reply patterns that packets are waiting for, mapped to their pending
+    resend. Next to the dict of patterns there is one prefix trie per header
+    so that finding the longest pattern matching a received packet only
+    walks the bytes of that packet, and packets on a header that no one is
+    waiting for are rejected with a single lookup.
+    """
+
+    # Key in a trie node that marks that a pattern ends in the node
+    _END = None
+
+    def __init__(self):
+        self._patterns = {}
+        self._tries = {}
+        self._lock = Lock()
+
+    def __contains__(self, pattern):
+        return pattern in self._patterns
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def __str__(self):
+        return str(self._patterns.keys())
+
+    def get(self, pattern, default=None):
+        """Get the value for a pattern"""
+        return self._patterns.get(pattern, default)
+
+    def values(self):
+        """Get the values of all the patterns"""
+        return self._patterns.values()
+
+    def clear(self):
+        """Remove all the patterns"""
+        with self._lock:
+            self._patterns = {}
+            self._tries = {}
+
+    def __setitem__(self, pattern, value):
+        with self._lock:
+            if pattern not in self._patterns:
+                node = self._tries.setdefault(pattern[0], {})
+                for byte in pattern[1:]:
+                    node = node.setdefault(byte, {})
+                node[self._END] = True
+            self._patterns[pattern] = value
+
+    def pop_longest_match(self, header, data):
+        """
+        Remove the longest pattern that the packet with header and data
+        (a tuple of bytes) starts with and return its value. Returns None if
+        no pattern matches.
+        """
+        if header not in self._tries:
+            return None
+        with self._lock:
+            node = self._tries.get(header)
+            if node is None:
+                return None
+            match_len = 0
+            for (index, byte) in enumerate(data):
+                node = node.get(byte)
+                if node is None:
+                    break
+                if self._END in node:
+                    match_len = index + 1
+            if match_len == 0:
+                return None
+            pattern = (header,) + tuple(data[0:match_len])
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Found longest match %s", pattern)
+            self._remove(pattern)
+            return self._patterns.pop(pattern)
+
+    def _remove(self, pattern):
+        """Remove the pattern from the trie, pruning empty nodes"""
+        path = [self._tries[pattern[0]]]
+        for byte in pattern[1:]:
+            path.append(path[-1][byte])
+        del path[-1][self._END]
+        for index in range(len(pattern) - 1, 0, -1):
+            if path[index]:
+                return
+            del path[index - 1][pattern[index]]
+        if not path[0]:
+            del self._tries[pattern[0]]
+
+
+class _ResendScheduler(Thread):
+    """
+    Single thread that calls the resend callbacks for all the packets that
+    are waiting for answers. The deadlines are kept in a heap, cancelled
+    entries are left in the heap and skipped when they expire.
+    """
+    def __init__(self):
+        Thread.__init__(self)
+        self._heap = []
+        self._condition = Condition()
+        self._counter = 0
+
+    def schedule(self, delay, callback):
+        """Call callback in delay seconds, returns an entry for cancel()"""
+        with self._condition:
+            # The counter keeps the entries ordered when deadlines are equal
+            self._counter += 1
+            entry = [time.time() + delay, self._counter, callback]
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        """Cancel an entry returned by schedule(), None is ignored"""
+        if entry is not None:
+            entry[2] = None
+
+    def run(self):
+        while(True):
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                deadline = self._heap[0][0]
+                now = time.time()
+                if deadline > now:
+                    self._condition.wait(deadline - now)
+                    continue
+                callback = heapq.heappop(self._heap)[2]
+            if callback is None:
+                continue
+            try:
+                callback()
+            except Exception:  # pylint: disable=W0703
+                import traceback
+                logger.warning("Exception while resending packet\n\n%s",
+                               traceback.format_exc())
+
+
 class _IncomingPacketHandler(Thread):
     """Handles incoming packets and sends the data to the correct receivers"""
+
+    # Size of the dispatch table, one slot for every possible port/channel
+    # combination in the CRTP header
+    NBR_OF_PORTS = 16
+    NBR_OF_CHANNELS = 4
+
     def __init__(self, cf):
         Thread.__init__(self)
         self.cf = cf
         self.cb = []
+        self._cb_lock = Lock()
+        self._dispatch = None
+        self._rebuild_dispatch_table()
 
     def add_port_callback(self, port, cb):
         """Add a callback for data that comes on a specific port"""
@@ -336,9 +497,11 @@ class _IncomingPacketHandler(Thread):
     def remove_port_callback(self, port, cb):
         """Remove a callback for data that comes on a specific port"""
         logger.debug("Removing callback on port [%d] to [%s]", port, cb)
-        for port_callback in self.cb:
-            if (port_callback[0] == port and port_callback[4] == cb):
-                self.cb.remove(port_callback)
+        with self._cb_lock:
+            self.cb = [port_callback for port_callback in self.cb
+                       if not (port_callback[0] == port and
+                               port_callback[4] == cb)]
+            self._rebuild_dispatch_table()
 
     def add_header_callback(self, cb, port, channel, port_mask=0xFF,
                             channel_mask=0xFF):
@@ -347,7 +510,33 @@ class _IncomingPacketHandler(Thread):
         possibility to add a mask for channel and port for multiple
         hits for same callback.
         """
-        self.cb.append([port, port_mask, channel, channel_mask, cb])
+        with self._cb_lock:
+            self.cb.append([port, port_mask, channel, channel_mask, cb])
+            self._rebuild_dispatch_table()
+
+    def _rebuild_dispatch_table(self):
+        """
+        Pre-compute which callbacks should be called for every port/channel
+        combination. Each slot holds a tuple of callbacks (in registration
+        order) and a flag telling if any of them is a real receiver for the
+        header. The table is replaced as a whole so the receiving thread
+        never sees a half updated table.
+        """
+        table = []
+        for port in range(self.NBR_OF_PORTS):
+            channels = []
+            for channel in range(self.NBR_OF_CHANNELS):
+                callbacks = []
+                found = False
+                for cb in self.cb:
+                    if (cb[0] == port & cb[1] and
+                            cb[2] == channel & cb[3]):
+                        callbacks.append(cb[4])
+                        if (cb[0] != 0xFF):
+                            found = True
+                channels.append((tuple(callbacks), found))
+            table.append(tuple(channels))
+        self._dispatch = tuple(table)
 
     def run(self):
         while(True):
@@ -362,22 +551,19 @@ class _IncomingPacketHandler(Thread):
             #All-packet callbacks
             self.cf.packet_received.call(pk)
 
-            found = False
-            for cb in self.cb:
-                if (cb[0] == pk.port & cb[1] and
-                        cb[2] == pk.channel & cb[3]):
-                    try:
-                        cb[4](pk)
-                    except Exception:  # pylint: disable=W0703
-                        # Disregard pylint warning since we want to catch all
-                        # exceptions and we can't know what will happen in
-                        # the callbacks.
-                        import traceback
-                        logger.warning("Exception while doing callback on port"
-                                       " [%d]\n\n%s", pk.port,
-                                       traceback.format_exc())
-                    if (cb[0] != 0xFF):
-                        found = True
+            (callbacks, found) = self._dispatch[pk.port & 0x0F][
+                pk.channel & 0x03]
+            for cb in callbacks:
+                try:
+                    cb(pk)
+                except Exception:  # pylint: disable=W0703
+                    # Disregard pylint warning since we want to catch all
+                    # exceptions and we can't know what will happen in
+                    # the callbacks.
+                    import traceback
+                    logger.warning("Exception while doing callback on port"
+                                   " [%d]\n\n%s", pk.port,
+                                   traceback.format_exc())
 
             if not found:
                 logger.warning("Got packet on header (%d,%d) but no callback "
@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2011-2013 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+"""
+Future based front-end for the Crazyflie API.
+
+The operations that complete later (connecting, reading and setting
+parameters, reading and writing memories) return a Future instead of
+taking callbacks. The caller can block on result() or add a callback that
+is called when the operation is done. Log data is received by iterating
+over a LogStream. The futures are completed from the threads that already
+call the callbacks of the Crazyflie API and the front-end adds no threads
+of its own, but each Crazyflie still runs its own threads (incoming packet
+handler, resend scheduler, parameter updater and link driver). An
+application can wait for several Crazyflies from one thread with gather()
+instead of using a thread per Crazyflie.
+
+Example:
+fcf = FutureCrazyflie()
+fcf.connect("radio://0/10/250K").result(10)
+print fcf.param.get("pid_rate.pitch_kp").result(1)
+with fcf.log.stream(logconf) as stream:
+    for (timestamp, data) in stream:
+        ...
+"""
+
+__author__ = 'Bitcraze AB'
+__all__ = ['Future', 'FutureTimeout', 'FutureCrazyflie', 'LogStream',
+           'gather']
+
+from threading import Event, Lock
+import Queue
+
+from . import Crazyflie
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class FutureTimeout(Exception):
+    """Raised when the result of a Future is not available in time"""
+    pass
+
+
+class Future(object):
+    """The result of an operation that will be done later"""
+
+    def __init__(self):
+        self._done = Event()
+        self._lock = Lock()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        """Return True if the operation is done"""
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the operation to be done and return its result, raises
+        the exception of the operation if it failed or FutureTimeout"""
+        if not self._done.wait(timeout):
+            raise FutureTimeout()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """Wait for the operation to be done and return its exception, None
+        if it succeeded"""
+        if not self._done.wait(timeout):
+            raise FutureTimeout()
+        return self._exception
+
+    def add_done_callback(self, cb):
+        """Call cb with the future when it's done, directly if it already
+        is"""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(cb)
+                return
+        cb(self)
+
+    def set_result(self, result):
+        self._complete(result, None)
+
+    def set_exception(self, exception):
+        self._complete(None, exception)
+
+    def _complete(self, result, exception):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._result = result
+            self._exception = exception
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for cb in callbacks:
+            try:
+                cb(self)
+            except Exception:
+                logger.exception("Exception in future callback")
+
+
+def gather(futures):
+    """Return a Future for the list of results of all the futures, it fails
+    as soon as one of them fails"""
+    futures = list(futures)
+    gathered = Future()
+    remaining = [len(futures)]
+    lock = Lock()
+
+    def done_cb(future):
+        if future.exception() is not None:
+            gathered.set_exception(future.exception())
+            return
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                return
+        gathered.set_result([f.result() for f in futures])
+
+    if len(futures) == 0:
+        gathered.set_result([])
+    for f in futures:
+        f.add_done_callback(done_cb)
+    return gathered
+
+
+class FutureCrazyflie(object):
+    """
+    Wraps a Crazyflie to get futures instead of callbacks. The keyword
+    arguments are used to create the Crazyflie if none is supplied.
+    """
+
+    def __init__(self, crazyflie=None, **kwargs):
+        if crazyflie is None:
+            crazyflie = Crazyflie(**kwargs)
+        self.cf = crazyflie
+        self.param = _FutureParam(crazyflie)
+        self.log = _FutureLog(crazyflie)
+        self.mem = _FutureMemory(crazyflie)
+
+    def connect(self, link_uri):
+        """Open the link, the future is done with this object when the
+        Crazyflie is connected and its TOCs are downloaded"""
+        future = Future()
+
+        def connected(uri):
+            if uri == link_uri:
+                future.set_result(self)
+
+        def failed(uri, errmsg):
+            if uri == link_uri:
+                future.set_exception(Exception(errmsg))
+
+        def done(f):
+            self.cf.connected.remove_callback(connected)
+            self.cf.connection_failed.remove_callback(failed)
+
+        self.cf.connected.add_callback(connected)
+        self.cf.connection_failed.add_callback(failed)
+        future.add_done_callback(done)
+        self.cf.open_link(link_uri)
+        return future
+
+    def disconnect(self):
+        """Close the link, the future is done when it's closed (which is
+        right away since closing the link doesn't wait for the Crazyflie)"""
+        future = Future()
+        self.cf.close_link()
+        future.set_result(None)
+        return future
+
+
+class _FutureParam(object):
+    """Parameter access with futures"""
+
+    def __init__(self, crazyflie):
+        self.cf = crazyflie
+
+    def get(self, complete_name):
+        """Read the value of a parameter from the Crazyflie, the future is
+        done with the value as a string"""
+        future = Future()
+        if not self.cf.param.toc.get_element_by_complete_name(complete_name):
+            future.set_exception(KeyError(complete_name))
+            return future
+        (group, name) = complete_name.split(".", 1)
+
+        def updated(updated_name, value):
+            if updated_name == complete_name:
+                self.cf.param.remove_update_callback(group, name, updated)
+                future.set_result(value)
+
+        self.cf.param.add_update_callback(group, name, updated)
+        self.cf.param.request_param_update(complete_name)
+        return future
+
+    def get_all(self):
+        """Read the values of all the parameters, the future is done with a
+        dict of complete name to value"""
+        future = Future()
+        values = {}
+        groups = self.cf.param.toc.toc.keys()
+
+        def updated(complete_name, value):
+            values[complete_name] = value
+
+        def all_updated():
+            for group in groups:
+                self.cf.param.remove_update_callback(group, cb=updated)
+            future.set_result(values)
+
+        def failed(msg):
+            for group in groups:
+                self.cf.param.remove_update_callback(group, cb=updated)
+            future.set_exception(Exception(msg))
+
+        for group in groups:
+            self.cf.param.add_update_callback(group, cb=updated)
+        self.cf.param.request_all_updates(all_updated, failed)
+        return future
+
+    def set(self, complete_name, value):
+        """Set the value of a parameter, the future is done when the
+        Crazyflie has confirmed the new value"""
+        return self.set_values({complete_name: value})
+
+    def set_values(self, values):
+        """Set the values of the parameters in the dict values, indexed on
+        complete name, the future is done when all are confirmed"""
+        future = Future()
+        for complete_name in values:
+            element = self.cf.param.toc.get_element_by_complete_name(
+                complete_name)
+            if not element:
+                future.set_exception(KeyError(complete_name))
+                return future
+            if element.access == element.RO_ACCESS:
+                future.set_exception(
+                    ValueError("{} is read only".format(complete_name)))
+                return future
+        self.cf.param.set_values(
+            values, lambda: future.set_result(None),
+            lambda msg: future.set_exception(Exception(msg)))
+        return future
+
+
+class _FutureMemory(object):
+    """Memory access with futures"""
+
+    def __init__(self, crazyflie):
+        self.cf = crazyflie
+
+    def read(self, memory, addr, length):
+        """Read from a memory, the future is done with the data"""
+        future = Future()
+
+        def read_done(mem, read_addr, data):
+            if mem.id == memory.id and read_addr == addr:
+                self.cf.mem.mem_read_cb.remove_callback(read_done)
+                future.set_result(data)
+
+        self.cf.mem.mem_read_cb.add_callback(read_done)
+        if not self.cf.mem.read(memory, addr, length):
+            self.cf.mem.mem_read_cb.remove_callback(read_done)
+            future.set_exception(Exception("There is already a read"
+                                           " operation ongoing for memory"
+                                           " id {}".format(memory.id)))
+        return future
+
+    def write(self, memory, addr, data):
+        """Write to a memory, the future is done when it's written"""
+        future = Future()
+
+        def write_done(mem, write_addr):
+            if mem.id == memory.id and write_addr == addr:
+                self.cf.mem.mem_write_cb.remove_callback(write_done)
+                future.set_result(None)
+
+        self.cf.mem.mem_write_cb.add_callback(write_done)
+        if not self.cf.mem.write(memory, addr, data):
+            self.cf.mem.mem_write_cb.remove_callback(write_done)
+            future.set_exception(Exception("There is already a write"
+                                           " operation ongoing for memory"
+                                           " id {}".format(memory.id)))
+        return future
+
+
+class _FutureLog(object):
+    """Logging with futures and streams"""
+
+    def __init__(self, crazyflie):
+        self.cf = crazyflie
+
+    def start(self, logconf):
+        """Add the log configuration if needed and start it, the future is
+        done when the Crazyflie has started the logging"""
+        future = Future()
+        if logconf.cf is None or not logconf.valid:
+            self.cf.log.add_config(logconf)
+            if not logconf.valid:
+                future.set_exception(ValueError("Invalid log configuration"
+                                                " {}".format(logconf.name)))
+                return future
+
+        def started(is_started):
+            if is_started:
+                future.set_result(None)
+
+        def error(conf, msg):
+            future.set_exception(Exception(msg))
+
+        def done(f):
+            logconf.started_cb.remove_callback(started)
+            logconf.error_cb.remove_callback(error)
+
+        logconf.started_cb.add_callback(started)
+        logconf.error_cb.add_callback(error)
+        future.add_done_callback(done)
+        logconf.start()
+        return future
+
+    def stream(self, logconf, maxsize=None, tuples=False):
+        """Start the log configuration and return a LogStream of its
+        samples"""
+        return LogStream(self, logconf, maxsize, tuples)
+
+
+class LogStream(object):
+    """
+    Iterator over the samples of a log configuration, as (timestamp, data)
+    where data is a dict of variable name to value, or a tuple of the values
+    in the order of the variables if tuples is True. The iteration blocks
+    until the next sample and ends when the stream is closed or the
+    Crazyflie is disconnected. If the samples aren't read fast enough the
+    queue keeps the maxsize first ones and the rest are counted in dropped.
+    """
+
+    # Default max number of samples waiting to be read
+    MAXSIZE = 1000
+
+    # Put in the queue to end the iteration
+    _END = object()
+
+    def __init__(self, future_log, logconf, maxsize=None, tuples=False):
+        self.cf = future_log.cf
+        self.logconf = logconf
+        self.dropped = 0
+        self._maxsize = maxsize if maxsize else self.MAXSIZE
+        # The size is limited in _sample so that _END always fits
+        self._queue = Queue.Queue()
+        self._lock = Lock()
+        self._ended = False
+        self._closed = False
+        if tuples:
+            self._data_cb = logconf.data_received_tuple_cb
+        else:
+            self._data_cb = logconf.data_received_cb
+        self._data_cb.add_callback(self._sample)
+        self.cf.disconnected.add_callback(self._disconnected)
+        self.started = future_log.start(logconf)
+        self.started.add_done_callback(self._start_done)
+
+    def _sample(self, timestamp, data, logconf):
+        if self._queue.qsize() >= self._maxsize:
+            self.dropped += 1
+        else:
+            self._queue.put((timestamp, data))
+
+    def _start_done(self, future):
+        if future.exception() is not None:
+            self._end()
+
+    def _disconnected(self, uri):
+        self._end()
+
+    def _end(self):
+        with self._lock:
+            if self._ended:
+                return
+            self._ended = True
+        self._data_cb.remove_callback(self._sample)
+        self.cf.disconnected.remove_callback(self._disconnected)
+        self._queue.put(self._END)
+
+    def close(self):
+        """Stop the logging and end the iteration"""
+        if self._closed:
+            return
+        self._closed = True
+        self.logconf.stop()
+        self._end()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        sample = self._queue.get(True)
+        if sample is self._END:
+            # Let any other iteration end as well
+            self._queue.put(self._END)
+            raise StopIteration()
+        return sample
@@ -68,6 +68,8 @@ __all__ = ['Log', 'LogTocElement']
 
 import struct
 import errno
+import array
+from threading import Lock
 from cflib.crtp.crtpstack import CRTPPacket, CRTPPort
 from cflib.utils.callbacks import Caller
 from .toc import Toc, TocFetcher
@@ -97,6 +99,18 @@ GET_TOC_ELEMENT = "GET_TOC_ELEMENT"
 # The max size of a CRTP packet payload
 MAX_LOG_DATA_PACKET_SIZE = 30
 
+# Header of a log data packet: block id and a 24 bit timestamp split in the
+# 16 low bits and the 8 high bits
+_LOG_DATA_HEADER = struct.Struct("<BHB")
+
+# Log timestamps are 24 bit milliseconds and will wrap around
+_TIMESTAMP_MASK = 0xFFFFFF
+
+# Typecodes used for batched sample columns, the unpack strings are the same
+# as the array typecodes except for uint32_t where 'L' is 8 bytes on some
+# platforms
+_ARRAY_TYPECODES = {'L': 'I'}
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -143,6 +157,12 @@ class LogConfig(object):
     def __init__(self, name, period_in_ms):
         """Initialize the entry"""
         self.data_received_cb = Caller()
+        # Called with the same data as data_received_cb but with the values
+        # in a tuple ordered as variable_names instead of in a dict
+        self.data_received_tuple_cb = Caller()
+        # Called with batches of samples when batching is enabled, see
+        # enable_batching()
+        self.data_batch_received_cb = Caller()
         self.error_cb = Caller()
         self.started_cb = Caller()
         self.added_cb = Caller()
@@ -159,6 +179,15 @@ class LogConfig(object):
         self.variables = []
         self.default_fetch_as = []
         self.name = name
+        self.variable_names = ()
+        self._unpacker = None
+        self._typecodes = ()
+
+        self._batch_samples = None
+        self._batch_time = None
+        self._batch_lock = Lock()
+        self._batch_timestamps = None
+        self._batch_columns = None
 
     def add_variable(self, name, fetch_as=None):
         """Add a new variable to the configuration.
@@ -199,6 +228,8 @@ class LogConfig(object):
 
     def _set_started(self, started):
         self._started = started
+        if not started:
+            self.flush_batch()
         self.started_cb.call(started)
 
     def _get_started(self):
@@ -212,6 +243,7 @@ class LogConfig(object):
         if (self.cf.link is not None):
             if (self._added is False):
                 logger.debug("First time block is started, add block")
+                self._compile_unpacker()
                 pk = CRTPPacket()
                 pk.set_header(5, CHAN_SETTINGS)
                 pk.data = (CMD_CREATE_BLOCK, self.id)
@@ -265,21 +297,99 @@ class LogConfig(object):
                 pk.data = (CMD_DELETE_BLOCK, self.id)
                 self.cf.send_packet(pk, expected_reply=(CMD_DELETE_BLOCK, self.id))
 
+    def _compile_unpacker(self):
+        """Create one struct for unpacking all the variables in the block at
+        once together with the names of the variables in the same order"""
+        unpackstring = "<"
+        for var in self.variables:
+            # Strip the byte order, it's set once for the whole block
+            unpackstring += LogTocElement.get_unpack_string_from_id(
+                var.fetch_as)[1:]
+        self._unpacker = struct.Struct(unpackstring)
+        self.variable_names = tuple([var.name for var in self.variables])
+        self._typecodes = tuple([_ARRAY_TYPECODES.get(c, c)
+                                 for c in unpackstring[1:]])
+
+    def enable_batching(self, samples=None, time_in_ms=None):
+        """Deliver samples in batches to data_batch_received_cb.
+
+        samples - Deliver a batch when this many samples are collected
+        time_in_ms - Deliver a batch when it spans this many milliseconds of
+                     log timestamps
+
+        The callback is called with (timestamps, columns, logconf) where
+        timestamps is an array of the log timestamps and columns is a dict
+        with one array per variable name. The arrays can be wrapped without
+        copying using numpy.frombuffer. Any samples left in the batch are
+        delivered when the block is stopped or when flush_batch() is
+        called."""
+        if not samples and not time_in_ms:
+            raise ValueError("Batching needs a sample count or a time")
+        with self._batch_lock:
+            self._batch_samples = samples
+            self._batch_time = time_in_ms
+            if self._batch_timestamps is None:
+                self._new_batch()
+
+    def disable_batching(self):
+        """Deliver any pending batch and stop batching samples"""
+        self.flush_batch()
+        with self._batch_lock:
+            self._batch_samples = None
+            self._batch_time = None
+            self._batch_timestamps = None
+            self._batch_columns = None
+
+    def flush_batch(self):
+        """Deliver the samples collected so far in the current batch"""
+        with self._batch_lock:
+            if not self._batch_timestamps:
+                return
+            timestamps = self._batch_timestamps
+            columns = self._batch_columns
+            self._new_batch()
+        self.data_batch_received_cb.call(
+            timestamps, dict(zip(self.variable_names, columns)), self)
+
+    def _new_batch(self):
+        """Start a new batch with empty columns"""
+        self._batch_timestamps = array.array('I')
+        self._batch_columns = tuple([array.array(t)
+                                     for t in self._typecodes])
+
+    def _add_to_batch(self, timestamp, values):
+        """Add one sample to the current batch and deliver it if full"""
+        with self._batch_lock:
+            if self._batch_timestamps is None:
+                return
+            if len(self._batch_columns) != len(values):
+                # The layout was compiled after batching was enabled
+                self._new_batch()
+            timestamps = self._batch_timestamps
+            timestamps.append(timestamp)
+            for (column, value) in zip(self._batch_columns, values):
+                column.append(value)
+            full = (self._batch_samples and
+                    len(timestamps) >= self._batch_samples)
+            if not full and self._batch_time:
+                span = (timestamp - timestamps[0]) & _TIMESTAMP_MASK
+                full = span >= self._batch_time
+        if full:
+            self.flush_batch()
+
     def unpack_log_data(self, log_data, timestamp):
         """Unpack received logging data so it represent real values according
         to the configuration in the entry"""
-        ret_data = {}
-        data_index = 0
-        for var in self.variables:
-            size = LogTocElement.get_size_from_id(var.fetch_as)
-            name = var.name
-            unpackstring = LogTocElement.get_unpack_string_from_id(
-                var.fetch_as)
-            value = struct.unpack(unpackstring,
-                                  log_data[data_index:data_index + size])[0]
-            data_index += size
-            ret_data[name] = value
-        self.data_received_cb.call(timestamp, ret_data, self)
+        if self._unpacker is None:
+            self._compile_unpacker()
+        values = self._unpacker.unpack_from(log_data)
+        if self._batch_timestamps is not None:
+            self._add_to_batch(timestamp, values)
+        if self.data_received_tuple_cb.callbacks:
+            self.data_received_tuple_cb.call(timestamp, values, self)
+        if self.data_received_cb.callbacks:
+            ret_data = dict(zip(self.variable_names, values))
+            self.data_received_cb.call(timestamp, ret_data, self)
 
 
 class LogTocElement:
@@ -361,6 +471,8 @@ class Log():
 
     def __init__(self, crazyflie=None):
         self.log_blocks = []
+        # Blocks indexed on id, used when dispatching incoming packets
+        self._block_table = {}
         # Called with newly created blocks
         self.block_added_cb = Caller()
 
@@ -425,6 +537,7 @@ class Log():
             logconf.valid = True
             logconf.cf = self.cf
             self.log_blocks.append(logconf)
+            self._block_table[logconf.id] = logconf
             self.block_added_cb.call(logconf)
         else:
             logconf.valid = False
@@ -442,16 +555,25 @@ class Log():
         self.cf.send_packet(pk, expected_reply=(CMD_RESET_LOGGING,))
 
     def _find_block(self, id):
-        for block in self.log_blocks:
-            if block.id == id:
-                return block
-        return None
+        return self._block_table.get(id)
 
     def _new_packet_cb(self, packet):
         """Callback for newly arrived packets with TOC information"""
         chan = packet.channel
-        cmd = packet.datal[0]
-        payload = struct.pack("B" * (len(packet.datal) - 1), *packet.datal[1:])
+
+        # Fast path for log data since it's by far the most common packet
+        if (chan == CHAN_LOGDATA):
+            data = packet.data
+            (id, ts_low, ts_high) = _LOG_DATA_HEADER.unpack_from(data)
+            block = self._block_table.get(id)
+            if (block is not None):
+                block.unpack_log_data(data[4:], ts_low | ts_high << 16)
+            else:
+                logger.warning("Error no LogEntry to handle id=%d", id)
+            return
+
+        cmd = ord(packet.data[0])
+        payload = packet.data[1:]
 
         if (chan == CHAN_SETTINGS):
             id = ord(payload[0])
@@ -522,6 +644,7 @@ class Log():
                 if not self._toc:
                     logger.debug("Logging reset, continue with TOC download")
                     self.log_blocks = []
+                    self._block_table = {}
 
                     self._toc = Toc()
                     toc_fetcher = TocFetcher(self.cf, LogTocElement,
@@ -529,15 +652,3 @@ class Log():
                                              self._toc, self._refresh_callback,
                                              self._toc_cache)
                     toc_fetcher.start()
-
-        if (chan == CHAN_LOGDATA):
-            chan = packet.channel
-            id = packet.datal[0]
-            block = self._find_block(id)
-            timestamps = struct.unpack("<BBB", packet.data[1:4])
-            timestamp = (timestamps[0] | timestamps[1] << 8 | timestamps[2] << 16)
-            logdata = packet.data[4:]
-            if (block is not None):
-                block.unpack_log_data(logdata, timestamp)
-            else:
-                logger.warning("Error no LogEntry to handle id=%d", id)
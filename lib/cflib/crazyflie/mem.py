@@ -36,6 +36,7 @@ __all__ = ['Memory', 'MemoryElement']
 
 import struct
 import errno
+import time
 from cflib.crtp.crtpstack import CRTPPacket, CRTPPort
 from cflib.utils.callbacks import Caller
 from binascii import crc32
@@ -54,6 +55,14 @@ CMD_INFO_DETAILS = 2
 # The max size of a CRTP packet payload
 MAX_LOG_DATA_PACKET_SIZE = 30
 
+# Number of chunks kept in flight when reading/writing memories
+DEFAULT_WINDOW = 4
+
+# Time to wait for a read chunk before requesting it again. The Crazyflie
+# answers the requests one at a time so it's scaled with the window.
+READ_TIMEOUT = 1
+READ_TIMEOUT_PER_CHUNK = 0.25
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -292,127 +301,186 @@ class OWElement(MemoryElement):
 
 
 class _ReadRequest:
-    """Class used to handle memory reads that will split up the read in multiple packets in necessary"""
+    """Class used to handle memory reads that will split up the read in
+    multiple packets if necessary. Up to window chunks are requested at the
+    same time and the replies are placed in the data by address."""
     MAX_DATA_LENGTH = 20
 
-    def __init__(self, mem, addr, length, cf):
+    def __init__(self, mem, addr, length, cf, window=DEFAULT_WINDOW):
         """Initialize the object with good defaults"""
         self.mem = mem
         self.addr = addr
-        self._bytes_left = length
         self.data = ""
         self.cf = cf
-
-        self._current_addr = addr
+        self.window = max(1, window)
+        # Transfer speed in bytes/s, set when the read is done
+        self.throughput = None
+
+        self._length = length
+        # Chunks not requested yet as (address, length), in address order
+        self._chunks = []
+        for chunk_addr in range(addr, addr + length, self.MAX_DATA_LENGTH):
+            self._chunks.append((chunk_addr,
+                                 min(self.MAX_DATA_LENGTH,
+                                     addr + length - chunk_addr)))
+        self._chunks.reverse()
+        # Chunks requested but not answered yet, address -> length
+        self._in_flight = {}
+        # Data received, address -> data
+        self._received = {}
+        self._start_time = None
 
     def start(self):
-        """Start the fetching of the data"""
-        self._request_new_chunk()
+        """Start the fetching of the data. Returns True if there is nothing
+        to read."""
+        self._start_time = time.time()
+        if not self._chunks:
+            return True
+        self._request_more_chunks()
+        return False
 
-    def resend(self):
-        logger.info("Sending write again...")
-        self._request_new_chunk()
+    def resend(self, addr):
+        """Request the chunk at addr again"""
+        if addr in self._in_flight:
+            logger.info("Sending read again...")
+            self._request_chunk(addr, self._in_flight[addr])
 
-    def _request_new_chunk(self):
-        """Called to request a new chunk of data to be read from the Crazyflie"""
-        # Figure out the length of the next request
-        new_len = self._bytes_left
-        if new_len > _ReadRequest.MAX_DATA_LENGTH:
-            new_len = _ReadRequest.MAX_DATA_LENGTH
+    def _request_more_chunks(self):
+        """Request new chunks until the window is full"""
+        while self._chunks and len(self._in_flight) < self.window:
+            (addr, length) = self._chunks.pop()
+            self._in_flight[addr] = length
+            self._request_chunk(addr, length)
 
-        logger.info("Requesting new chunk of {}bytes at 0x{:X}".format(new_len, self._current_addr))
+    def _request_chunk(self, addr, length):
+        """Called to request a chunk of data to be read from the Crazyflie"""
+        logger.debug("Requesting new chunk of %dbytes at 0x%X", length, addr)
 
-        # Request the data for the next address
+        # Request the data for the address
         pk = CRTPPacket()
         pk.set_header(CRTPPort.MEM, CHAN_READ)
-        pk.data = struct.pack("<BIB", self.mem.id, self._current_addr, new_len)
+        pk.data = struct.pack("<BIB", self.mem.id, addr, length)
         reply = struct.unpack("<BBBBB", pk.data[:-1])
-        self.cf.send_packet(pk, expected_reply=reply, timeout=1)
+        self.cf.send_packet(pk, expected_reply=reply,
+                            timeout=max(READ_TIMEOUT,
+                                        READ_TIMEOUT_PER_CHUNK * self.window))
 
     def add_data(self, addr, data):
-        """Callback when data is received from the Crazyflie"""
-        data_len = len(data)
-        if not addr == self._current_addr:
-            logger.warning("Address did not match when adding data to read request!")
-            return
-
-        # Add the data and calculate the next address to fetch
-        self.data += data
-        self._bytes_left -= data_len
-        self._current_addr += data_len
-
-        if self._bytes_left > 0:
-            self._request_new_chunk()
+        """Callback when data is received from the Crazyflie. Returns True
+        when all the data has been received."""
+        if addr not in self._in_flight:
+            # Duplicate reply due to resending or not for this request
+            logger.debug("Got data for 0x%X that we are not waiting for",
+                         addr)
+            return False
+
+        if len(data) == 0:
+            # A successful reply should have data, read the chunk again
+            logger.debug("Got no data for 0x%X", addr)
+            self.resend(addr)
             return False
-        else:
-            return True
+
+        length = self._in_flight.pop(addr)
+        if len(data) < length:
+            # Only request the part that is still missing
+            self._chunks.append((addr + len(data), length - len(data)))
+        self._received[addr] = data[:length]
+        self._request_more_chunks()
+
+        if self._in_flight:
+            return False
+
+        self.data = "".join([self._received[a]
+                             for a in sorted(self._received.keys())])
+        elapsed = time.time() - self._start_time
+        if elapsed > 0:
+            self.throughput = self._length / elapsed
+        logger.info("Read %d bytes from memory %d in %.3fs",
+                    self._length, self.mem.id, elapsed)
+        return True
+
 
 class _WriteRequest:
-    """Class used to handle memory reads that will split up the read in multiple packets in necessary"""
+    """Class used to handle memory writes that will split up the write in
+    multiple packets if necessary. Up to window chunks are written at the
+    same time and only the chunks that fail are written again."""
     MAX_DATA_LENGTH = 20
 
-    def __init__(self, mem, addr, data, cf):
+    def __init__(self, mem, addr, data, cf, window=DEFAULT_WINDOW):
         """Initialize the object with good defaults"""
         self.mem = mem
         self.addr = addr
-        self._bytes_left = len(data)
-        self._data = data
         self.data = ""
         self.cf = cf
-
-        self._current_addr = addr
-
-        self._sent_packet = None
-        self._sent_reply = None
-
-        self._addr_add = 0
+        self.window = max(1, window)
+        # Transfer speed in bytes/s, set when the write is done
+        self.throughput = None
+
+        self._length = len(data)
+        # Chunks not written yet as (address, data), in address order
+        self._chunks = []
+        for offset in range(0, len(data), self.MAX_DATA_LENGTH):
+            self._chunks.append(
+                (addr + offset,
+                 tuple(data[offset:offset + self.MAX_DATA_LENGTH])))
+        self._chunks.reverse()
+        # Chunks written but not confirmed yet, address -> packet
+        self._in_flight = {}
+        self._start_time = None
 
     def start(self):
-        """Start the fetching of the data"""
-        self._write_new_chunk()
-
-    def resend(self):
-        logger.info("Sending write again...")
-        self.cf.send_packet(self._sent_packet, expected_reply=self._sent_reply, timeout=3)
+        """Start the writing of the data. Returns True if there is nothing
+        to write."""
+        self._start_time = time.time()
+        if not self._chunks:
+            return True
+        self._write_more_chunks()
+        return False
 
-    def _write_new_chunk(self):
-        """Called to request a new chunk of data to be read from the Crazyflie"""
-        # Figure out the length of the next request
-        new_len = len(self._data)
-        if new_len > _WriteRequest.MAX_DATA_LENGTH:
-            new_len = _WriteRequest.MAX_DATA_LENGTH
+    def resend(self, addr):
+        """Write the chunk at addr again"""
+        if addr in self._in_flight:
+            logger.info("Sending write again...")
+            self._send_chunk(self._in_flight[addr])
+
+    def _write_more_chunks(self):
+        """Write new chunks until the window is full"""
+        while self._chunks and len(self._in_flight) < self.window:
+            (addr, data) = self._chunks.pop()
+            logger.debug("Writing new chunk of %dbytes at 0x%X",
+                         len(data), addr)
+            pk = CRTPPacket()
+            pk.set_header(CRTPPort.MEM, CHAN_WRITE)
+            pk.data = struct.pack("<BI", self.mem.id, addr)
+            pk.data += struct.pack("B" * len(data), *data)
+            self._in_flight[addr] = pk
+            self._send_chunk(pk)
+
+    def _send_chunk(self, pk):
+        """Send a write packet, the reply is matched on id and address"""
+        reply = struct.unpack("<BBBBB", pk.data[:5])
+        self.cf.send_packet(pk, expected_reply=reply, timeout=3)
 
-        logger.info("Writing new chunk of {}bytes at 0x{:X}".format(new_len, self._current_addr))
+    def write_done(self, addr):
+        """Callback when a write is confirmed by the Crazyflie. Returns True
+        when all the data has been written."""
+        if self._in_flight.pop(addr, None) is None:
+            logger.debug("Got write reply for 0x%X that we are not waiting "
+                         "for", addr)
+            return False
 
-        data = self._data[:new_len]
-        self._data = self._data[new_len:]
+        self._write_more_chunks()
 
-        pk = CRTPPacket()
-        pk.set_header(CRTPPort.MEM, CHAN_WRITE)
-        pk.data = struct.pack("<BI", self.mem.id, self._current_addr)
-        # Create a tuple used for matching the reply using id and address
-        reply = struct.unpack("<BBBBB", pk.data)
-        self._sent_reply = reply
-        # Add the data
-        pk.data += struct.pack("B"*len(data), *data)
-        self._sent_packet = pk
-        self.cf.send_packet(pk, expected_reply=reply, timeout=3)
+        if self._in_flight:
+            return False
 
-        self._addr_add = len(data)
+        elapsed = time.time() - self._start_time
+        if elapsed > 0:
+            self.throughput = self._length / elapsed
+        logger.info("This write request is done, %d bytes in %.3fs",
+                    self._length, elapsed)
+        return True
 
-    def write_done(self, addr):
-        """Callback when data is received from the Crazyflie"""
-        if not addr == self._current_addr:
-            logger.warning("Address did not match when adding data to read request!")
-            return
-
-        if len(self._data) > 0:
-            self._current_addr += self._addr_add
-            self._write_new_chunk()
-            return False
-        else:
-            logger.info("This write request is done")
-            return True
 
 class Memory():
     """Access memories on the Crazyflie"""
@@ -452,6 +520,10 @@ class Memory():
 
         self._getting_count = False
 
+        # Throughput in bytes/s of the last finished read and write
+        self.read_throughput = None
+        self.write_throughput = None
+
     def _mem_update_done(self, mem):
         """Callback from each individual memory (only 1-wire) when reading of header/elements are done"""
         if mem.id in self._ow_mems_left_to_update:
@@ -482,30 +554,36 @@ class Memory():
         return ret
 
 
-    def write(self, memory, addr, data):
-        """Write the specified data to the given memory at the given address"""
+    def write(self, memory, addr, data, window=DEFAULT_WINDOW):
+        """Write the specified data to the given memory at the given address,
+        keeping up to window packets in flight"""
         if memory.id in self._write_requests:
             logger.warning("There is already a write operation ongoing for memory id {}".format(memory.id))
             return False
 
-        wreq = _WriteRequest(memory, addr, data, self.cf)
+        wreq = _WriteRequest(memory, addr, data, self.cf, window)
         self._write_requests[memory.id] = wreq
 
-        wreq.start()
+        if wreq.start():
+            self._write_requests.pop(memory.id, None)
+            self.mem_write_cb.call(wreq.mem, wreq.addr)
 
         return True
 
 
-    def read(self, memory, addr, length):
-        """Read the specified amount of bytes from the given memory at the given address"""
+    def read(self, memory, addr, length, window=DEFAULT_WINDOW):
+        """Read the specified amount of bytes from the given memory at the
+        given address, keeping up to window packets in flight"""
         if memory.id in self._read_requests:
             logger.warning("There is already a read operation ongoing for memory id {}".format(memory.id))
             return False
 
-        rreq = _ReadRequest(memory, addr, length, self.cf)
+        rreq = _ReadRequest(memory, addr, length, self.cf, window)
         self._read_requests[memory.id] = rreq
 
-        rreq.start()
+        if rreq.start():
+            self._read_requests.pop(memory.id, None)
+            self.mem_read_cb.call(rreq.mem, rreq.addr, rreq.data)
 
         return True
 
@@ -533,8 +611,8 @@ class Memory():
     def _new_packet_cb(self, packet):
         """Callback for newly arrived packets for the memory port"""
         chan = packet.channel
-        cmd = packet.datal[0]
-        payload = struct.pack("B" * (len(packet.datal) - 1), *packet.datal[1:])
+        cmd = packet.datat[0]
+        payload = packet.data[1:]
         #logger.info("--------------->CHAN:{}=>{}".format(chan, struct.unpack("B"*len(payload), payload)))
 
         if chan == CHAN_INFO:
@@ -628,22 +706,23 @@ class Memory():
                 if status == 0:
                     if wreq.write_done(addr):
                         self._write_requests.pop(id, None)
+                        self.write_throughput = wreq.throughput
                         self.mem_write_cb.call(wreq.mem, wreq.addr)
                 else:
-                    wreq.resend()
+                    wreq.resend(addr)
 
         if chan == CHAN_READ:
             id = cmd
             (addr, status) = struct.unpack("<IB", payload[0:5])
-            data = struct.unpack("B"*len(payload[5:]), payload[5:])
-            logger.info("READ: Mem={}, addr=0x{:X}, status=0x{}, data={}".format(id, addr, status, data))
+            logger.debug("READ: Mem=%d, addr=0x%X, status=0x%X, %d bytes",
+                         id, addr, status, len(payload) - 5)
             # Find the read request
             if id in self._read_requests:
-                logger.info("READING: We are still interested in request for mem {}".format(id))
                 rreq = self._read_requests[id]
                 if status == 0:
                     if rreq.add_data(addr, payload[5:]):
                         self._read_requests.pop(id, None)
+                        self.read_throughput = rreq.throughput
                         self.mem_read_cb.call(rreq.mem, rreq.addr, rreq.data)
                 else:
-                    rreq.resend()
+                    rreq.resend(addr)
@@ -41,7 +41,7 @@ from cflib.utils.callbacks import Caller
 import struct
 from cflib.crtp.crtpstack import CRTPPacket, CRTPPort
 from .toc import Toc, TocFetcher
-from threading import Thread, Lock
+from threading import Thread, Lock, Condition
 
 from Queue import Queue
 
@@ -63,6 +63,13 @@ TOC_RESET = 0
 TOC_GETNEXT = 1
 TOC_GETCRC32 = 2
 
+# Number of read/write requests kept in flight at the same time
+DEFAULT_WINDOW = 4
+
+# Time to wait for a reply before resending a request, scaled with the
+# window since the Crazyflie answers the requests one at a time
+REQUEST_TIMEOUT = 0.2
+
 
 # One element entry in the TOC
 class ParamTocElement:
@@ -119,11 +126,18 @@ class Param():
         self.param_update_callbacks = {}
         self.group_update_callbacks = {}
         self.param_updater = None
-
-        self.param_updater = _ParamUpdater(self.cf, self._param_updated)
+        # Pending bulk requests, each one is a set of var ids that are still
+        # waiting for a reply, the callback to call when it's empty and the
+        # callback to call if the request fails
+        self._bulk_requests = []
+        self._bulk_lock = Lock()
+
+        self.param_updater = _ParamUpdater(self.cf, self._param_updated,
+                                           self._request_dropped)
         self.param_updater.start()
 
         self.cf.disconnected.add_callback(self.param_updater.close)
+        self.cf.disconnected.add_callback(self._disconnected)
 
     def _param_updated(self, pk):
         """Callback with data for an updated parameter"""
@@ -140,6 +154,53 @@ class Param():
                 self.group_update_callbacks[element.group].call(complete_name, s)
         else:
             logger.debug("Variable id [%d] not found in TOC", var_id)
+        self._bulk_request_updated(var_id)
+
+    def _bulk_request_updated(self, var_id):
+        """Mark var_id as done in the pending bulk requests and call the
+        callbacks of the ones that are finished"""
+        finished = []
+        with self._bulk_lock:
+            for request in self._bulk_requests:
+                request[0].discard(var_id)
+                if not request[0]:
+                    finished.append(request)
+            for request in finished:
+                self._bulk_requests.remove(request)
+        for (_, cb, _) in finished:
+            if cb:
+                cb()
+
+    def _fail_bulk_requests(self, msg, var_id=None):
+        """Remove the pending bulk requests waiting for var_id, or all of
+        them if var_id is None, and call their failed callbacks"""
+        with self._bulk_lock:
+            failed = [request for request in self._bulk_requests
+                      if var_id is None or var_id in request[0]]
+            for request in failed:
+                self._bulk_requests.remove(request)
+        for (_, _, failed_cb) in failed:
+            if failed_cb:
+                failed_cb(msg)
+
+    def _request_dropped(self, var_id):
+        """Callback from the updater when a request could not be sent"""
+        self._fail_bulk_requests("Could not send request for parameter"
+                                 " [{}], not connected".format(var_id), var_id)
+
+    def _disconnected(self, uri):
+        """The replies of the pending bulk requests will never come"""
+        self._fail_bulk_requests("Disconnected from {}".format(uri))
+
+    def _add_bulk_request(self, var_ids, cb, failed_cb):
+        """Track a bulk request, cb is called when all var_ids are done and
+        failed_cb with an error message if they can't be"""
+        if not var_ids:
+            if cb:
+                cb()
+            return
+        with self._bulk_lock:
+            self._bulk_requests.append((set(var_ids), cb, failed_cb))
 
     def remove_update_callback(self, group, name=None, cb=None):
         """Remove the supplied callback for a group or a group.name"""
@@ -190,10 +251,52 @@ class Param():
         self.param_updater.request_param_update(
             self.toc.get_element_id(complete_name))
 
+    def request_all_updates(self, all_updated_cb=None, failed_cb=None):
+        """
+        Request an update of the value for all the parameters in the TOC.
+        The update callbacks are called for each parameter as usual and
+        all_updated_cb (without arguments) once all of them are updated.
+        If the Crazyflie is disconnected before that failed_cb is called
+        with an error message instead.
+        """
+        var_ids = []
+        for group in self.toc.toc.values():
+            for element in group.values():
+                var_ids.append(element.ident)
+        self._add_bulk_request(var_ids, all_updated_cb, failed_cb)
+        for var_id in sorted(var_ids):
+            self.param_updater.request_param_update(var_id)
+
     def set_value(self, complete_name, value):
         """
         Set the value for the supplied parameter.
         """
+        pk = self._create_setvalue_packet(complete_name, value)
+        if pk:
+            self.param_updater.request_param_setvalue(pk)
+
+    def set_values(self, values, all_set_cb=None, failed_cb=None):
+        """
+        Set the values for all the parameters in the dict values, indexed on
+        complete name. all_set_cb (without arguments) is called once all the
+        parameters that could be set have been confirmed by the Crazyflie.
+        If the Crazyflie is disconnected before that failed_cb is called
+        with an error message instead.
+        """
+        packets = []
+        for complete_name in values:
+            pk = self._create_setvalue_packet(complete_name,
+                                              values[complete_name])
+            if pk:
+                packets.append(pk)
+        self._add_bulk_request([pk.datat[0] for pk in packets], all_set_cb,
+                               failed_cb)
+        for pk in packets:
+            self.param_updater.request_param_setvalue(pk)
+
+    def _create_setvalue_packet(self, complete_name, value):
+        """Create the packet for setting a parameter, returns None if the
+        parameter can't be set"""
         element = self.toc.get_element_by_complete_name(complete_name)
 
         if not element:
@@ -206,35 +309,42 @@ class Param():
             pk = CRTPPacket()
             pk.set_header(CRTPPort.PARAM, WRITE_CHANNEL)
             pk.data = struct.pack('<B', varid)
-            pk.data += struct.pack(element.pytype, eval(value))
-            self.param_updater.request_param_setvalue(pk)
+            pk.data += struct.pack(element.pytype, eval(str(value)))
+            return pk
+        return None
 
 
 class _ParamUpdater(Thread):
     """This thread will update params through a queue to make sure that we
-    get back values"""
-    def __init__(self, cf, updated_callback):
-        """Initialize the thread"""
+    get back values. Up to window requests are kept in flight, but only one
+    at a time for each parameter since the replies are matched on var id."""
+    def __init__(self, cf, updated_callback, dropped_callback=None,
+                 window=DEFAULT_WINDOW):
+        """Initialize the thread, dropped_callback is called with the var id
+        of requests that can't be sent"""
         Thread.__init__(self)
         self.setDaemon(True)
-        self.wait_lock = Lock()
         self.cf = cf
         self.updated_callback = updated_callback
+        self.dropped_callback = dropped_callback
+        self.window = max(1, window)
         self.request_queue = Queue()
         self.cf.add_port_callback(CRTPPort.PARAM, self._new_packet_cb)
         self._should_close = False
-        self._req_param = -1
+        # Requests sent to the Crazyflie that have not been answered yet,
+        # indexed on var id
+        self._in_flight = {}
+        self._in_flight_condition = Condition()
 
     def close(self, uri):
         # First empty the queue from all packets
         while not self.request_queue.empty():
             self.request_queue.get()
-        # Then force an unlock of the mutex if we are waiting for a packet
-        # we didn't get back due to a disconnect for example.
-        try:
-            self.wait_lock.release()
-        except:
-            pass
+        # Then forget the requests we are waiting for since we will not get
+        # any replies due to a disconnect for example.
+        with self._in_flight_condition:
+            self._in_flight = {}
+            self._in_flight_condition.notify()
 
     def request_param_setvalue(self, pk):
         """Place a param set value request on the queue. When this is sent to
@@ -244,15 +354,12 @@ class _ParamUpdater(Thread):
     def _new_packet_cb(self, pk):
         """Callback for newly arrived packets"""
         if pk.channel == READ_CHANNEL or pk.channel == WRITE_CHANNEL:
-            var_id = pk.datal[0]
-            if (pk.channel != TOC_CHANNEL and self._req_param == var_id
-                and pk is not None):
-                self.updated_callback(pk)
-                self._req_param = -1
-                try:
-                    self.wait_lock.release()
-                except:
-                    pass
+            var_id = pk.datat[0]
+            with self._in_flight_condition:
+                if self._in_flight.pop(var_id, None) is None:
+                    return
+                self._in_flight_condition.notify()
+            self.updated_callback(pk)
 
     def request_param_update(self, var_id):
         """Place a param update request on the queue"""
@@ -265,9 +372,18 @@ class _ParamUpdater(Thread):
     def run(self):
         while not self._should_close:
             pk = self.request_queue.get()  # Wait for request update
-            self.wait_lock.acquire()
-            if self.cf.link:
-                self._req_param = pk.datal[0]
-                self.cf.send_packet(pk, expected_reply=(pk.datat[0:2]))
-            else:
-                self.wait_lock.release()
+            var_id = pk.datat[0]
+            with self._in_flight_condition:
+                while (len(self._in_flight) >= self.window or
+                       var_id in self._in_flight):
+                    self._in_flight_condition.wait()
+                # Read once so the request is sent only if it was registered
+                link = self.cf.link
+                if link:
+                    self._in_flight[var_id] = pk
+            if not link:
+                if self.dropped_callback:
+                    self.dropped_callback(var_id)
+                continue
+            self.cf.send_packet(pk, expected_reply=(pk.datat[0:2]),
+                                timeout=REQUEST_TIMEOUT * self.window)
@@ -36,6 +36,7 @@ __all__ = ['TocElement', 'Toc', 'TocFetcher']
 
 from cflib.crtp.crtpstack import CRTPPacket
 import struct
+import time
 
 import logging
 logger = logging.getLogger(__name__)
@@ -51,6 +52,14 @@ IDLE = "IDLE"
 GET_TOC_INFO = "GET_TOC_INFO"
 GET_TOC_ELEMENT = "GET_TOC_ELEMENT"
 
+# Number of TOC element requests kept in flight while fetching, 1 will
+# fetch one element at a time
+DEFAULT_WINDOW = 4
+
+# Time to wait for a TOC element before resending the request. It's scaled
+# with the window since the Crazyflie answers the requests one at a time.
+ELEMENT_TIMEOUT = 0.2
+
 
 class TocElement:
     """An element in the TOC."""
@@ -65,11 +74,22 @@ class TocElement:
     access = RO_ACCESS
 
 
-class Toc:
+class Toc(object):
     """Container for TocElements."""
 
     def __init__(self):
-        self.toc = {}
+        self._toc = {}
+        self._id_index = None
+
+    def _get_toc(self):
+        return self._toc
+
+    def _set_toc(self, toc):
+        self._toc = toc
+        self._id_index = None
+
+    # Elements by group and name, replacing it will rebuild the id index
+    toc = property(_get_toc, _set_toc)
 
     def clear(self):
         """Clear the TOC"""
@@ -82,6 +102,7 @@ class Toc:
         except KeyError:
             self.toc[element.group] = {}
             self.toc[element.group][element.name] = element
+        self._id_index = None
 
     def get_element_by_complete_name(self, complete_name):
         """Get a TocElement element identified by complete name from the
@@ -114,17 +135,20 @@ class Toc:
     def get_element_by_id(self, ident):
         """Get a TocElement element identified by index number from the
         container."""
-        for group in self.toc.keys():
-            for name in self.toc[group].keys():
-                if self.toc[group][name].ident == ident:
-                    return self.toc[group][name]
-        return None
+        id_index = self._id_index
+        if id_index is None:
+            id_index = {}
+            for group in self.toc.values():
+                for element in group.values():
+                    id_index[element.ident] = element
+            self._id_index = id_index
+        return id_index.get(ident)
 
 
 class TocFetcher:
     """Fetches TOC entries from the Crazyflie"""
     def __init__(self, crazyflie, element_class, port, toc_holder,
-                 finished_callback, toc_cache):
+                 finished_callback, toc_cache, window=DEFAULT_WINDOW):
         self.cf = crazyflie
         self.port = port
         self._crc = 0
@@ -135,10 +159,17 @@ class TocFetcher:
         self._toc_cache = toc_cache
         self.finished_callback = finished_callback
         self.element_class = element_class
+        self.window = max(1, window)
+        self._outstanding = set()
+        self._nbr_of_received = 0
+        self._start_time = None
+        # Time in seconds it took to fetch the TOC
+        self.fetch_time = None
 
     def start(self):
         """Initiate fetching of the TOC."""
         logger.debug("[%d]: Start fetching...", self.port)
+        self._start_time = time.time()
         # Register callback in this class for the port
         self.cf.add_port_callback(self.port, self._new_packet_cb)
 
@@ -152,7 +183,11 @@ class TocFetcher:
     def _toc_fetch_finished(self):
         """Callback for when the TOC fetching is finished"""
         self.cf.remove_port_callback(self.port, self._new_packet_cb)
-        logger.debug("[%d]: Done!", self.port)
+        self.state = IDLE
+        self.fetch_time = time.time() - self._start_time
+        logger.info("[%d]: TOC with %d items done in %.3fs (window %d)",
+                    self.port, self.nbr_of_items, self.fetch_time,
+                    self.window)
         self.finished_callback()
 
     def _new_packet_cb(self, packet):
@@ -160,7 +195,7 @@ class TocFetcher:
         chan = packet.channel
         if (chan != 0):
             return
-        payload = struct.pack("B" * (len(packet.datal) - 1), *packet.datal[1:])
+        payload = packet.data[1:]
 
         if (self.state == GET_TOC_INFO):
             [self.nbr_of_items, self._crc] = struct.unpack("<BI", payload[:5])
@@ -172,32 +207,46 @@ class TocFetcher:
                 self.toc.toc = cache_data
                 logger.info("TOC for port [%s] found in cache" % self.port)
                 self._toc_fetch_finished()
+            elif self.nbr_of_items == 0:
+                self._toc_fetch_finished()
             else:
                 self.state = GET_TOC_ELEMENT
                 self.requested_index = 0
-                self._request_toc_element(self.requested_index)
+                self._nbr_of_received = 0
+                self._outstanding = set()
+                self._request_more_elements()
 
         elif (self.state == GET_TOC_ELEMENT):
-            # Always add new element, but only request new if it's not the
-            # last one.
-            if self.requested_index != ord(payload[0]):
+            # Replies can come in any order and can be duplicated due to
+            # resending, only add the ones we are still waiting for
+            index = ord(payload[0])
+            if index not in self._outstanding:
                 return
-            self.toc.add_element(self.element_class(payload))
-            logger.debug("Added element [%s]",
-                         self.element_class(payload).ident)
-            if (self.requested_index < (self.nbr_of_items - 1)):
-                logger.debug("[%d]: More variables, requesting index %d",
-                             self.port, self.requested_index + 1)
-                self.requested_index = self.requested_index + 1
-                self._request_toc_element(self.requested_index)
+            self._outstanding.remove(index)
+            element = self.element_class(payload)
+            self.toc.add_element(element)
+            self._nbr_of_received += 1
+            logger.debug("Added element [%s]", element.ident)
+            if (self._nbr_of_received < self.nbr_of_items):
+                self._request_more_elements()
             else:  # No more variables in TOC
                 self._toc_cache.insert(self._crc, self.toc.toc)
                 self._toc_fetch_finished()
 
+    def _request_more_elements(self):
+        """Request new elements until the window is full or all the elements
+        have been requested"""
+        while (len(self._outstanding) < self.window and
+               self.requested_index < self.nbr_of_items):
+            self._outstanding.add(self.requested_index)
+            self._request_toc_element(self.requested_index)
+            self.requested_index += 1
+
     def _request_toc_element(self, index):
         """Request information about a specific item in the TOC"""
         logger.debug("Requesting index %d on port %d", index, self.port)
         pk = CRTPPacket()
         pk.set_header(self.port, TOC_CHANNEL)
         pk.data = (CMD_TOC_ELEMENT, index)
-        self.cf.send_packet(pk, expected_reply=(CMD_TOC_ELEMENT, index))
+        self.cf.send_packet(pk, expected_reply=(CMD_TOC_ELEMENT, index),
+                            timeout=ELEMENT_TIMEOUT * self.window)
@@ -35,72 +35,208 @@ __author__ = 'Bitcraze AB'
 __all__ = ['TocCache']
 
 import os
+import re
 import json
+import struct
+import sqlite3
 from glob import glob
+from collections import OrderedDict
+from threading import Lock
 
 import logging
 logger = logging.getLogger(__name__)
 
-from .log import LogTocElement  # pylint: disable=W0611
-from .param import ParamTocElement  # pylint: disable=W0611
- 
+from .log import LogTocElement
+from .param import ParamTocElement
+
+# Classes that can be stored in the cache, indexed by the name used in the
+# cache files
+_ELEMENT_CLASSES = {'LogTocElement': LogTocElement,
+                    'ParamTocElement': ParamTocElement}
+# The same classes indexed by the id used in the packed format
+_PACKED_CLASSES = {0: LogTocElement, 1: ParamTocElement}
+_PACKED_CLASS_IDS = {LogTocElement: 0, ParamTocElement: 1}
+
+# Packed element: class id, ident, access and the length of the strings
+# (group, name, ctype and pytype separated by \0) that follow
+_PACKED_ELEMENT = struct.Struct("<BHBB")
+
+# Name of the single file store in the cache directories
+PACKED_CACHE_FILE = "toccache.db"
+
+# Number of decoded TOCs kept in memory
+LRU_SIZE = 8
+
+_CACHE_FILE_PATTERN = re.compile("([0-9A-F]{8})\\.json$")
 
 
 class TocCache():
     """
     Access to TOC cache. To turn of the cache functionality
     don't supply any directories.
+
+    The TOCs are found through an index on CRC that is built when the cache
+    is created and the decoded TOCs are kept in a small LRU in memory. TOCs
+    can either be stored as one JSON file per TOC or, if packed is set, in
+    one single file (sqlite) with the elements in a compact binary format.
     """
-    def __init__(self, ro_cache=None, rw_cache=None):
-        self._cache_files = []
-        if (ro_cache):
-            self._cache_files += glob(ro_cache + "/*.json")
+    def __init__(self, ro_cache=None, rw_cache=None, packed=False):
+        # Index from CRC to where the TOC is stored, either the path to a
+        # JSON file or the path to a packed store
+        self._index = {}
+        self._lru = OrderedDict()
+        self._lock = Lock()
+        self._packed = packed
+
         if (rw_cache):
-            self._cache_files += glob(rw_cache + "/*.json")
             if not os.path.exists(rw_cache):
                 os.makedirs(rw_cache)
 
+        # Index the read-only cache first so entries in the read-write cache
+        # take precedence
+        for cache_dir in (ro_cache, rw_cache):
+            if (cache_dir):
+                self._index_dir(cache_dir)
+
         self._rw_cache = rw_cache
 
+    def _index_dir(self, cache_dir):
+        """Add all the TOCs found in the directory to the index"""
+        for name in glob(cache_dir + "/*.json"):
+            match = _CACHE_FILE_PATTERN.search(name)
+            if match:
+                self._index[int(match.group(1), 16)] = name
+        db = os.path.join(cache_dir, PACKED_CACHE_FILE)
+        if os.path.isfile(db):
+            try:
+                conn = sqlite3.connect(db)
+                try:
+                    for (crc,) in conn.execute("SELECT crc FROM toc"):
+                        self._index[crc] = db
+                finally:
+                    conn.close()
+            except sqlite3.Error as exp:
+                logger.warning("Error while indexing cache [%s]: %s",
+                               db, str(exp))
+
     def fetch(self, crc):
         """ Try to get a hit in the cache, return None otherwise """
-        cache_data = None
-        pattern = "%08X.json" % crc
-        hit = None
+        with self._lock:
+            cache_data = self._lru.pop(crc, None)
+            if cache_data is None:
+                cache_data = self._load(crc)
+            if cache_data is not None:
+                self._remember(crc, cache_data)
 
-        for name in self._cache_files:
-            if (name.endswith(pattern)):
-                hit = name
+        if cache_data is None:
+            return None
+        # The elements are shared but the containers are not, since the
+        # caller owns the TOC that is returned
+        return dict([(group, dict(elements))
+                     for (group, elements) in cache_data.items()])
 
-        if (hit):
-            try:
+    def _remember(self, crc, toc):
+        """Put a TOC first in the LRU"""
+        self._lru[crc] = toc
+        while len(self._lru) > LRU_SIZE:
+            self._lru.popitem(last=False)
+
+    def _load(self, crc):
+        """Load a TOC from where the index says it's stored"""
+        hit = self._index.get(crc)
+        if not hit:
+            return None
+
+        cache_data = None
+        try:
+            if hit.endswith(PACKED_CACHE_FILE):
+                conn = sqlite3.connect(hit)
+                try:
+                    row = conn.execute("SELECT data FROM toc WHERE crc=?",
+                                       (crc,)).fetchone()
+                finally:
+                    conn.close()
+                if row:
+                    cache_data = self._unpack(str(row[0]))
+            else:
                 cache = open(hit)
                 cache_data = json.load(cache,
                                        object_hook=self._decoder)
                 cache.close()
-            except Exception as exp:
-                logger.warning("Error while parsing cache file [%s]:%s",
-                               hit, str(exp))
+        except Exception as exp:
+            logger.warning("Error while parsing cache file [%s]:%s",
+                           hit, str(exp))
 
         return cache_data
 
     def insert(self, crc, toc):
         """ Save a new cache to file """
+        with self._lock:
+            self._remember(crc, dict([(group, dict(elements))
+                                      for (group, elements) in toc.items()]))
+
         if self._rw_cache:
             try:
-                filename = "%s/%08X.json" % (self._rw_cache, crc)
-                cache = open(filename, 'w')
-                cache.write(json.dumps(toc, indent=2,
-                            default=self._encoder))
-                cache.close()
+                if self._packed:
+                    filename = os.path.join(self._rw_cache, PACKED_CACHE_FILE)
+                    conn = sqlite3.connect(filename)
+                    try:
+                        conn.execute("CREATE TABLE IF NOT EXISTS toc "
+                                     "(crc INTEGER PRIMARY KEY, data BLOB)")
+                        conn.execute("INSERT OR REPLACE INTO toc VALUES "
+                                     "(?, ?)",
+                                     (crc, sqlite3.Binary(self._pack(toc))))
+                        conn.commit()
+                    finally:
+                        conn.close()
+                else:
+                    filename = "%s/%08X.json" % (self._rw_cache, crc)
+                    cache = open(filename, 'w')
+                    cache.write(json.dumps(toc, separators=(',', ':'),
+                                default=self._encoder))
+                    cache.close()
                 logger.info("Saved cache to [%s]", filename)
-                self._cache_files += [filename]
+                self._index[crc] = filename
             except Exception as exp:
                 logger.warning("Could not save cache to file [%s]: %s",
                                filename, str(exp))
         else:
             logger.warning("Could not save cache, no writable directory")
 
+    def _pack(self, toc):
+        """ Pack all the elements of a TOC in the compact binary format """
+        data = []
+        for elements in toc.values():
+            for elem in elements.values():
+                strings = "\0".join([elem.group, elem.name,
+                                     elem.ctype, elem.pytype])
+                data.append(_PACKED_ELEMENT.pack(
+                    _PACKED_CLASS_IDS[elem.__class__], elem.ident,
+                    elem.access, len(strings)))
+                data.append(strings)
+        return "".join(data)
+
+    def _unpack(self, data):
+        """ Unpack a TOC stored in the compact binary format """
+        toc = {}
+        index = 0
+        while index < len(data):
+            (class_id, ident, access, length) = \
+                _PACKED_ELEMENT.unpack_from(data, index)
+            index += _PACKED_ELEMENT.size
+            (group, name, ctype, pytype) = \
+                data[index:index + length].split("\0")
+            index += length
+            elem = _PACKED_CLASSES[class_id]()
+            elem.ident = ident
+            elem.group = group
+            elem.name = name
+            elem.ctype = ctype
+            elem.pytype = pytype
+            elem.access = access
+            toc.setdefault(group, {})[name] = elem
+        return toc
+
     def _encoder(self, obj):
         """ Encode a toc element leaf-node """
         return {'__class__': obj.__class__.__name__,
@@ -115,7 +251,7 @@ class TocCache():
     def _decoder(self, obj):
         """ Decode a toc element leaf-node """
         if '__class__' in obj:
-            elem = eval(obj['__class__'])()
+            elem = _ELEMENT_CLASSES[obj['__class__']]()
             elem.ident = obj['ident']
             elem.group = str(obj['group'])
             elem.name = str(obj['name'])
@@ -40,9 +40,11 @@ from .udpdriver import UdpDriver
 from .serialdriver import SerialDriver
 from .debugdriver import DebugDriver
 from .usbdriver import UsbDriver
+from .replaydriver import ReplayDriver
 from .exceptions import WrongUriType
 
-DRIVERS = [RadioDriver, SerialDriver, UdpDriver, DebugDriver, UsbDriver]
+DRIVERS = [RadioDriver, SerialDriver, UdpDriver, DebugDriver, UsbDriver,
+           ReplayDriver]
 INSTANCES = []
 
 
@@ -56,14 +58,15 @@ def init_drivers(enable_debug_driver=False):
             continue
 
 
-def scan_interfaces():
-    """ Scan all the interfaces for available Crazyflies """
+def scan_interfaces(full=False):
+    """ Scan all the interfaces for available Crazyflies, without using any
+    cached result if full is True """
     available = []
     found = []
     for instance in INSTANCES:
         logger.debug("Scanning: %s", instance)
         try:
-            found = instance.scan_interface()
+            found = instance.scan_interface(full)
             available += found
         except Exception:
             raise
@@ -84,11 +87,17 @@ def get_interfaces_status():
 def get_link_driver(uri, link_quality_callback=None, link_error_callback=None):
     """Return the link driver for the given URI. Returns None if no driver
     was found for the URI or the URI was not well formatted for the matching
-    driver."""
+    driver.
+
+    Drivers that can have several links open at the same time get a new
+    driver instance for each link."""
     for instance in INSTANCES:
+        driver = instance
+        if instance.MULTIPLE_LINKS:
+            driver = instance.__class__()
         try:
-            instance.connect(uri, link_quality_callback, link_error_callback)
-            return instance
+            driver.connect(uri, link_quality_callback, link_error_callback)
+            return driver
         except WrongUriType:
             continue
 
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2011-2013 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Capture of the CRTP packets sent and received by a Crazyflie.
+
+The capture file starts with a header: the magic "CFCAP", the format version
+(B) and the time the capture was started in seconds since epoch (<d). Each
+packet is then stored as the time since the start in seconds (<d), the
+direction (B, IN or OUT), the CRTP header (B), the length of the data (B)
+and the data. The times never go backwards even if the clock is adjusted
+during the capture.
+
+A capture can be played back with the replay driver, see replaydriver.
+"""
+
+__author__ = 'Bitcraze AB'
+__all__ = ['CrtpCapture', 'read_capture', 'IN', 'OUT']
+
+import collections
+import struct
+import threading
+import time
+
+from .crtpstack import CRTPPacket
+from cflib.utils.filewriter import FileWriterThread
+
+import logging
+logger = logging.getLogger(__name__)
+
+MAGIC = "CFCAP"
+VERSION = 1
+
+IN = 0
+OUT = 1
+
+_HEADER = struct.Struct("<5sBd")
+_RECORD = struct.Struct("<dBBB")
+
+# How often the buffered packets are written to the file, in seconds
+FLUSH_PERIOD = 0.5
+
+
+class CrtpCapture():
+    """Records all the packets sent and received by a Crazyflie to a
+    file"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.nbr_of_packets = 0
+        self._cf = None
+        self._file = None
+        self._records = collections.deque()
+        self._thread = None
+        self._start = 0
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def start(self, crazyflie):
+        """Start capturing the packets of the Crazyflie"""
+        if self._file:
+            return
+        self._file = open(self.filename, "wb")
+        self._start = time.time()
+        self._last = 0
+        self._file.write(_HEADER.pack(MAGIC, VERSION, self._start))
+        self._thread = FileWriterThread(self._file, self._records,
+                                        FLUSH_PERIOD)
+        self._thread.start()
+        self._cf = crazyflie
+        self._cf.packet_received.add_callback(self._packet_received)
+        self._cf.packet_sent.add_callback(self._packet_sent)
+        logger.info("Started capture to %s", self.filename)
+
+    def stop(self):
+        """Stop capturing and close the file"""
+        if not self._file:
+            return
+        self._cf.packet_received.remove_callback(self._packet_received)
+        self._cf.packet_sent.remove_callback(self._packet_sent)
+        self._cf = None
+        self._thread.stop()
+        self._thread = None
+        self._file.close()
+        self._file = None
+        logger.info("Stopped capture to %s, %d packets", self.filename,
+                    self.nbr_of_packets)
+
+    def capturing(self):
+        """Return True if packets are being captured"""
+        return self._file is not None
+
+    def _packet_received(self, pk):
+        self._add(IN, pk)
+
+    def _packet_sent(self, pk):
+        self._add(OUT, pk)
+
+    def _add(self, direction, pk):
+        data = pk.data
+        with self._lock:
+            # Keep the times monotonic
+            t = max(time.time() - self._start, self._last)
+            self._last = t
+            self.nbr_of_packets += 1
+            self._records.append(_RECORD.pack(t, direction, pk.header,
+                                              len(data)) + data)
+
+
+def read_capture(filename):
+    """Read a capture, returns the start time and a list of (time,
+    direction, CRTPPacket)"""
+    with open(filename, "rb") as f:
+        data = f.read()
+    (magic, version, start) = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise Exception("Not a CRTP capture")
+    if version != VERSION:
+        raise Exception("Unsupported CRTP capture version {}".format(version))
+
+    packets = []
+    i = _HEADER.size
+    while i + _RECORD.size <= len(data):
+        (t, direction, header, length) = _RECORD.unpack_from(data, i)
+        i += _RECORD.size
+        if i + length > len(data):
+            # The last packet was not completely written
+            break
+        packets.append((t, direction, CRTPPacket(header, data[i:i + length])))
+        i += length
+    return (start, packets)
@@ -40,6 +40,10 @@ class CRTPDriver:
     This class in inherited by all the CRTP link drivers.
     """
 
+    # True if the driver can have several links open at the same time, it's
+    # then instantiated for each link
+    MULTIPLE_LINKS = False
+
     def __init__(self):
         """Driver constructor. Throw an exception if the driver is unable to
         open the URI
@@ -75,10 +79,10 @@ class CRTPDriver:
         Return a human readable name of the interface.
         """
 
-    def scan_interface(self):
+    def scan_interface(self, full=False):
         """
         Scan interface for available Crazyflie quadcopters and return a list
-        witha them.
+        witha them. If full is True no cached result is used.
         """
 
     def enum(self):
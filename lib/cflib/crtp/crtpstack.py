@@ -34,9 +34,6 @@ __author__ = 'Bitcraze AB'
 __all__ = ['CRTPPort', 'CRTPPacket']
 
 
-import struct
-
-
 class CRTPPort:
     """
     Lists the available ports for the CRTP.
@@ -54,14 +51,21 @@ class CRTPPort:
 class CRTPPacket(object):
     """
     A packet that can be sent via the CRTP.
+
+    The payload is stored once as an immutable byte string. The list and
+    tuple views (datal/datat) are only created when they are first asked
+    for and the tuple is then kept until the payload is changed.
     """
 
+    __slots__ = ('size', 'header', '_port', '_channel', '_data', '_datat')
+
     def __init__(self, header=0, data=None):
         """
         Create an empty packet with default values.
         """
         self.size = 0
         self._data = ""
+        self._datat = None
         # The two bits in position 3 and 4 needs to be set for legacy
         # support of the bootloader
         self.header = header | 0x3 << 2
@@ -118,14 +122,14 @@ class CRTPPacket(object):
         if type(data) == str:
             self._data = data
         elif type(data) == list or type(data) == tuple:
-            if len(data) == 1:
-                self._data = struct.pack("B", data[0])
-            elif len(data) > 1:
-                self._data = struct.pack("B" * len(data), *data)
-            else:
-                self._data = ""
+            self._data = str(bytearray(data))
+        elif type(data) == bytearray:
+            self._data = str(data)
+        elif type(data) == memoryview:
+            self._data = data.tobytes()
         else:
             raise Exception("Data shall be of str, tupple or list type")
+        self._datat = None
 
     def _get_data_l(self):
         """Get the data in the packet as a list"""
@@ -133,7 +137,13 @@ class CRTPPacket(object):
 
     def _get_data_t(self):
         """Get the data in the packet as a tuple"""
-        return struct.unpack("B" * len(self._data), self._data)
+        if self._datat is None:
+            self._datat = tuple(bytearray(self._data))
+        return self._datat
+
+    def _get_data_view(self):
+        """Get a read-only view of the data without copying it"""
+        return memoryview(self._data)
 
     def __str__(self):
         """Get a string representation of the packet"""
@@ -143,5 +153,6 @@ class CRTPPacket(object):
     datal = property(_get_data_l, _set_data)
     datat = property(_get_data_t, _set_data)
     datas = property(_get_data, _set_data)
+    datav = property(_get_data_view, _set_data)
     port = property(_get_port, _set_port)
     channel = property(_get_channel, _set_channel)
@@ -276,7 +276,7 @@ class DebugDriver (CRTPDriver):
                                                      self._fake_mems)
         self._packet_handler.start()
 
-    def scan_interface(self):
+    def scan_interface(self, full=False):
         return [["debug://0/0", "Normal connection"],
                 ["debug://0/1", "Fail to connect"],
                 ["debug://0/2", "Incomplete log TOC download"],
@@ -324,7 +324,7 @@ class DebugDriver (CRTPDriver):
 
         if len(self._fake_mems) == 0:
             # Insert some data here
-            self._fake_mems.append(FakeMemory(type=0, size=100, addr=0))
+            self._fake_mems.append(FakeMemory(type=0, size=8192, addr=0))
             self._fake_mems.append(FakeMemory(type=1, size=112, addr=0x1234567890ABCDEF,
                                               data=[0xeb, 0x00, 0x00, 0x00, 0x00, 0x01, 0x01, 0x44, 0x00, 0x0e,
                                                     0x01, 0x09, 0x62, 0x63, 0x4c, 0x65, 0x64, 0x52, 0x69, 0x6e,
@@ -0,0 +1,522 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2011-2013 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Sharing of Crazyradio dongles between several radio links.
+
+A Crazyradio talks to one copter at a time, on one channel, data rate and
+address. The RadioManager lets several links use the same dongle by
+time-slicing the radio: one thread per dongle serves the links in a round
+robin and reconfigures the radio when going from one link to the next.
+Links opened without a dongle number are put on the least loaded dongle.
+"""
+
+__author__ = 'Bitcraze AB'
+__all__ = ['RadioManager', 'RadioLinkStats', 'get_manager', 'set_manager']
+
+import logging
+logger = logging.getLogger(__name__)
+
+import threading
+import Queue
+import array
+import time
+
+from cflib.drivers.crazyradio import Crazyradio
+from .radioscanner import RadioScanner
+
+# The radio address used when none is given
+DEFAULT_ADDRESS = (0xE7,) * 5
+
+_manager = None
+
+
+def get_manager():
+    """Get the RadioManager used by the radio link driver"""
+    global _manager
+    if _manager is None:
+        _manager = RadioManager()
+    return _manager
+
+
+def set_manager(manager):
+    """Set the RadioManager used by the radio link driver, e.g. one with a
+    fake Crazyradio backend"""
+    global _manager
+    _manager = manager
+
+
+class _LatencyHistogram():
+    """Histogram of latencies with fixed buckets"""
+
+    # Upper bounds of the buckets in ms, the last one catches the rest
+    BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, float("inf"))
+
+    def __init__(self):
+        self._counts = [0] * len(self.BUCKETS)
+
+    def add(self, latency):
+        """Add a latency given in seconds"""
+        latency_ms = latency * 1000
+        for (i, bound) in enumerate(self.BUCKETS):
+            if latency_ms <= bound:
+                self._counts[i] += 1
+                return
+
+    def get(self):
+        """Get the histogram as a list of (upper bound in ms, count)"""
+        return zip(self.BUCKETS, list(self._counts))
+
+
+class RadioLinkStats():
+    """Throughput and latency statistics of one radio link"""
+
+    # How often the rates are updated
+    RATE_PERIOD = 1.0
+
+    def __init__(self):
+        self.packets_sent = 0
+        self.packets_received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        # Number of radio transactions made for the link
+        self.polls = 0
+        # Radio transactions per second
+        self.poll_rate = 0.0
+        # Payload bytes per second, in both directions
+        self.throughput = 0.0
+        # Time packets have waited in the out queue before being sent
+        self.latency = _LatencyHistogram()
+        self._rate_start = time.time()
+        self._polls_at_start = 0
+        self._bytes_at_start = 0
+
+    def _update_rates(self, now):
+        period = now - self._rate_start
+        if period < self.RATE_PERIOD:
+            return
+        nbr_of_bytes = self.bytes_sent + self.bytes_received
+        self.poll_rate = (self.polls - self._polls_at_start) / period
+        self.throughput = (nbr_of_bytes - self._bytes_at_start) / period
+        self._rate_start = now
+        self._polls_at_start = self.polls
+        self._bytes_at_start = nbr_of_bytes
+
+    def __str__(self):
+        return ("{:.0f} polls/s, {:.0f} B/s, {} packets sent, {} packets"
+                " received".format(self.poll_rate, self.throughput,
+                                   self.packets_sent, self.packets_received))
+
+
+class RadioManager():
+    """
+    Opens the Crazyradio dongles and shares them between the radio links.
+
+    The radio_factory is called with a dongle number and should return a
+    Crazyradio, or raise an exception if there's no such dongle. Set
+    trust_fw_scan to use the firmware-driven scan of the dongles, it can
+    also be changed later with set_trust_fw_scan.
+    """
+
+    def __init__(self, radio_factory=None, trust_fw_scan=False):
+        if radio_factory is None:
+            radio_factory = lambda devid: Crazyradio(devid=devid)
+        self.radio_factory = radio_factory
+        self.scanner = RadioScanner(radio_factory,
+                                    trust_fw_scan=trust_fw_scan)
+        self._dongles = {}
+        self._lock = threading.Lock()
+        # Only one scan at a time, without blocking the links
+        self._scan_lock = threading.Lock()
+
+    def open_link(self, devid, channel, datarate, address=None, name="",
+                  link_quality_callback=None, link_error_callback=None):
+        """
+        Open a link to the copter on the channel, data rate and address.
+        The dongle number devid can be None to use the least loaded dongle.
+        Returns the link.
+        """
+        with self._lock:
+            dongle = self._get_dongle(devid)
+            link = _RadioLink(dongle, channel, datarate, address, name,
+                              link_quality_callback, link_error_callback)
+            dongle.add_link(link)
+        logger.info("Opened %s on dongle %d, %d link(s) on the dongle",
+                    name, dongle.devid, len(dongle.links))
+        return link
+
+    def close_link(self, link):
+        """Close the link and the dongle if it was the last link on it"""
+        dongle = link.dongle
+        with self._lock:
+            dongle.remove_link(link)
+            if len(dongle.links) > 0 or dongle.devid not in self._dongles:
+                return
+            del self._dongles[dongle.devid]
+
+        # Stopped without the lock since the radio thread can call
+        # close_link from its link error callback
+        dongle.stop()
+        try:
+            dongle.cradio.close()
+        except Exception:
+            # If the dongle was pulled out we will not make this call
+            pass
+
+    def scan(self, full=False, probe_callback=None):
+        """Scan for Crazyflies with the dongles that are not used by any
+        link, returns a list of [uri, description]"""
+        with self._lock:
+            used = self._dongles.keys()
+        with self._scan_lock:
+            return self.scanner.scan(full, skip_devids=used,
+                                     probe_callback=probe_callback)
+
+    def set_trust_fw_scan(self, trust):
+        """Use the firmware-driven scan of the dongles or not, the cached
+        scan result is dropped"""
+        with self._scan_lock:
+            self.scanner.trust_fw_scan = trust
+            self.scanner.invalidate()
+
+    def get_radio_version(self):
+        """Get the version of one of the dongles used by links, None if no
+        dongle is used"""
+        with self._lock:
+            for dongle in self._dongles.values():
+                return dongle.cradio.version
+        return None
+
+    def get_open_dongles(self):
+        """Get the numbers of the dongles used by links"""
+        return self._dongles.keys()
+
+    def get_stats(self):
+        """Get the statistics of all the open links as a list of
+        (link name, dongle number, RadioLinkStats)"""
+        stats = []
+        with self._lock:
+            for dongle in self._dongles.values():
+                for link in dongle.links:
+                    stats.append((link.name, dongle.devid, link.stats))
+        return stats
+
+    def _get_dongle(self, devid):
+        if devid is not None:
+            if devid not in self._dongles:
+                self._dongles[devid] = self._open_dongle(devid)
+            return self._dongles[devid]
+
+        least_loaded = None
+        for dongle in self._dongles.values():
+            if (least_loaded is None or
+                    len(dongle.links) < len(least_loaded.links)):
+                least_loaded = dongle
+
+        # Spread the links on all the dongles before sharing one
+        if least_loaded is None or len(least_loaded.links) > 0:
+            devid = 0
+            while devid in self._dongles:
+                devid += 1
+            try:
+                self._dongles[devid] = self._open_dongle(devid)
+                least_loaded = self._dongles[devid]
+            except Exception:
+                if least_loaded is None:
+                    raise
+
+        return least_loaded
+
+    def _open_dongle(self, devid):
+        cradio = self.radio_factory(devid)
+        if cradio.version >= 0.4:
+            cradio.set_arc(10)
+        else:
+            logger.warning("Radio version <0.4 will be obsoleted soon!")
+        dongle = _SharedRadio(devid, cradio)
+        dongle.start()
+        return dongle
+
+
+class _RadioLink():
+    """A link to one copter on a shared dongle"""
+
+    RETRYCOUNT_BEFORE_DISCONNECT = 10
+
+    def __init__(self, dongle, channel, datarate, address, name,
+                 link_quality_callback, link_error_callback):
+        self.dongle = dongle
+        self.channel = channel
+        self.datarate = datarate
+        self.address = address if address else DEFAULT_ADDRESS
+        self.name = name
+        self.link_quality_callback = link_quality_callback
+        self.link_error_callback = link_error_callback
+        self.in_queue = Queue.Queue()
+        # Limited size out queue to avoid "ReadBack" effect
+        self.out_queue = Queue.Queue(50)
+        self.stats = RadioLinkStats()
+        self.radio = _LinkRadio(self)
+        self.retry_before_disconnect = self.RETRYCOUNT_BEFORE_DISCONNECT
+        # Back-off of the polling while the link is idle
+        self.poll_wait = 0
+        self.next_poll = 0
+
+    def send(self, data):
+        """Queue raw data to be sent, raises Queue.Full if the out queue
+        stays full"""
+        self.out_queue.put((data, time.time()), True, 2)
+        self.dongle.wake()
+
+    def _error(self, message):
+        if self.link_error_callback is not None:
+            self.link_error_callback(message)
+
+
+class _LinkRadio():
+    """
+    The dongle as seen by one link, for direct use of the dongle while it's
+    paused (used by the bootloader). Changes to the channel, data rate and
+    address are kept as the settings of the link.
+    """
+
+    def __init__(self, link):
+        self._link = link
+
+    def set_channel(self, channel):
+        self._link.channel = channel
+        self._link.dongle.configuration_changed()
+        self._link.dongle.cradio.set_channel(channel)
+
+    def set_data_rate(self, datarate):
+        self._link.datarate = datarate
+        self._link.dongle.configuration_changed()
+        self._link.dongle.cradio.set_data_rate(datarate)
+
+    def set_address(self, address):
+        self._link.address = tuple(address)
+        self._link.dongle.configuration_changed()
+        self._link.dongle.cradio.set_address(address)
+
+    def __getattr__(self, name):
+        # Anything else, like a scan, might change the settings of the radio
+        self._link.dongle.configuration_changed()
+        return getattr(self._link.dongle.cradio, name)
+
+
+class _SharedRadio(threading.Thread):
+    """
+    Thread serving the links on one dongle.
+
+    Since the Crazyflie can only send data back in the acks each link has
+    to be polled. The links that have packets to send or are due for a poll
+    are served in a round robin, a link with traffic can make up to
+    MAX_BURST transactions in a row to save reconfigurations of the radio.
+    Each link polls as fast as possible while there is traffic and backs off
+    exponentially, up to MAX_POLL_WAIT, while it's idle.
+    """
+
+    # Limits for the time to wait between polls when a link is idle
+    MIN_POLL_WAIT = 0.0005
+    MAX_POLL_WAIT = 0.01
+
+    # Max number of transactions in a row for one link
+    MAX_BURST = 4
+
+    # Time to sleep when there is nothing to do
+    IDLE_WAIT = 0.1
+
+    def __init__(self, devid, cradio):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.setName("Crazyradio {}".format(devid))
+        self.devid = devid
+        self.cradio = cradio
+        self.links = []
+        self._lock = threading.Lock()
+        self._radio_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._sp = False
+        self._paused = False
+        # The (channel, datarate, address) the radio is configured for
+        self._config = None
+        self._next = 0
+
+    def add_link(self, link):
+        with self._lock:
+            self.links = self.links + [link]
+        self.wake()
+
+    def remove_link(self, link):
+        with self._lock:
+            self.links = [l for l in self.links if l is not link]
+
+    def wake(self):
+        """Wake up the thread, e.g. when a packet has been queued"""
+        self._wakeup.set()
+
+    def configuration_changed(self):
+        """The radio has been reconfigured outside of the thread"""
+        self._config = None
+
+    def pause(self):
+        """Stop using the dongle, for all the links on it"""
+        with self._radio_lock:
+            self._paused = True
+
+    def resume(self):
+        with self._radio_lock:
+            self._paused = False
+            self._config = None
+        self.wake()
+
+    def stop(self):
+        """ Stop the thread """
+        self._sp = True
+        self.wake()
+        try:
+            self.join()
+        except Exception:
+            pass
+
+    def run(self):
+        """ Run the radio thread """
+        null_packet = array.array('B', [0xFF])
+
+        while not self._sp:
+            self._wakeup.clear()
+            now = time.time()
+            (link, wait) = self._next_link(now)
+            if link is None:
+                self._wakeup.wait(wait)
+                continue
+
+            with self._radio_lock:
+                if self._paused:
+                    continue
+                for _ in xrange(self.MAX_BURST):
+                    if not self._transaction(link, null_packet):
+                        break
+
+    def _next_link(self, now):
+        """Get the next link to serve, or None and the time to wait until
+        a link is due for a poll"""
+        links = self.links
+        if self._paused or len(links) == 0:
+            return (None, self.IDLE_WAIT)
+
+        wait = self.IDLE_WAIT
+        for i in xrange(len(links)):
+            link = links[(self._next + i) % len(links)]
+            if not link.out_queue.empty() or link.next_poll <= now:
+                self._next = (self._next + i + 1) % len(links)
+                return (link, 0)
+            wait = min(wait, link.next_poll - now)
+        return (None, wait)
+
+    def _configure(self, link):
+        config = (link.channel, link.datarate, link.address)
+        if config == self._config:
+            return
+        if self._config is None or self._config[0] != link.channel:
+            self.cradio.set_channel(link.channel)
+        if self._config is None or self._config[1] != link.datarate:
+            self.cradio.set_data_rate(link.datarate)
+        if self._config is None or self._config[2] != link.address:
+            self.cradio.set_address(link.address)
+        self._config = config
+
+    def _transaction(self, link, null_packet):
+        """Make one radio transaction for the link, returns True if there
+        was any traffic"""
+        stats = link.stats
+        try:
+            (raw, queued) = link.out_queue.get(False)
+            stats.latency.add(time.time() - queued)
+            dataOut = array.array('B', raw)
+        except Queue.Empty:
+            dataOut = null_packet
+
+        try:
+            self._configure(link)
+            ackStatus = self.cradio.send_packet(dataOut)
+        except Exception as e:
+            import traceback
+            self._config = None
+            link._error("Error communicating with crazy radio"
+                        " ,it has probably been unplugged!\n"
+                        "Exception:%s\n\n%s" % (e,
+                        traceback.format_exc()))
+            return False
+
+        now = time.time()
+        stats.polls += 1
+        if dataOut is not null_packet:
+            stats.packets_sent += 1
+            stats.bytes_sent += len(dataOut) - 1
+        stats._update_rates(now)
+
+        # Analise the in data packet ...
+        if ackStatus is None:
+            link._error("Dongle communication error (ackStatus==None)")
+            return False
+
+        if (link.link_quality_callback is not None):
+            link.link_quality_callback((10 - ackStatus.retry) * 10)
+
+        # If no copter, retry
+        if ackStatus.ack is False:
+            link.retry_before_disconnect -= 1
+            if link.retry_before_disconnect == 0:
+                link._error("Too many packets lost")
+            return False
+        link.retry_before_disconnect = link.RETRYCOUNT_BEFORE_DISCONNECT
+
+        data = ackStatus.data
+
+        # The raw data is queued and the packet is only created when it's
+        # received from the queue
+        if len(data) > 0:
+            if type(data) == array.array:
+                link.in_queue.put(data.tostring())
+            else:
+                link.in_queue.put(str(bytearray(data)))
+            stats.packets_received += 1
+            stats.bytes_received += len(data) - 1
+
+        if len(data) > 0 or dataOut is not null_packet:
+            # Expect more traffic
+            link.poll_wait = 0
+            link.next_poll = now
+            return True
+
+        # Idle link, back off
+        link.poll_wait = min(self.MAX_POLL_WAIT,
+                             max(self.MIN_POLL_WAIT, link.poll_wait * 2))
+        link.next_poll = now + link.poll_wait
+        return False
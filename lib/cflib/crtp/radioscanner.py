@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2011-2013 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Scanning for Crazyflies with the Crazyradio dongles.
+
+A full scan sweeps the 126 channels at each of the three data rates. The
+RadioScanner makes it faster by sweeping the data rates in parallel when
+there are several dongles, and by using the firmware-driven scan of the
+dongle when the firmware is trusted. The result of a scan is cached for a
+while. When it has expired the copters seen before are probed first, which
+gives a fast first answer, and all the channels are then swept to find the
+new ones.
+"""
+
+__author__ = 'Bitcraze AB'
+__all__ = ['RadioScanner']
+
+import logging
+logger = logging.getLogger(__name__)
+
+import threading
+import time
+
+from cflib.drivers.crazyradio import Crazyradio
+
+# How long the result of a scan is reused, in seconds
+SCAN_CACHE_TTL = 5
+
+_DATARATES = ((Crazyradio.DR_250KPS, "250K"),
+              (Crazyradio.DR_1MPS, "1M"),
+              (Crazyradio.DR_2MPS, "2M"))
+
+
+class RadioScanner():
+    """
+    Scans for Crazyflies on all channels and data rates.
+
+    The radio_factory is called with a dongle number and should return a
+    Crazyradio, or raise an exception if there's no such dongle.
+    """
+
+    def __init__(self, radio_factory=None, ttl=SCAN_CACHE_TTL,
+                 trust_fw_scan=False):
+        if radio_factory is None:
+            radio_factory = lambda devid: Crazyradio(devid=devid)
+        self._radio_factory = radio_factory
+        self.ttl = ttl
+        self.trust_fw_scan = trust_fw_scan
+        # The (channel, datarate) where copters have been found
+        self._seen = set()
+        self._result = None
+        self._result_time = 0
+        # Duration of the last scan that used the dongles
+        self.scan_time = 0
+
+    def invalidate(self):
+        """Forget the result of the last scan"""
+        self._result = None
+
+    def scan(self, full=False, skip_devids=(), probe_callback=None):
+        """
+        Scan for Crazyflies and return a list of [uri, description]. A
+        recent result is reused unless full is True. Otherwise the copters
+        seen before are probed, and probe_callback is called with the ones
+        that answered (in the same format) before all the channels are
+        swept. The dongles in skip_devids are not used.
+        """
+        if (not full and self._result is not None and
+                time.time() - self._result_time < self.ttl):
+            return list(self._result)
+
+        radios = self._open_radios(skip_devids)
+        if len(radios) == 0:
+            return []
+
+        start = time.time()
+        try:
+            # The dongle that found each (channel, datarate)
+            found = {}
+            if not full and len(self._seen) > 0:
+                (devid, radio) = radios[0]
+                probed = self._probe(devid, radio, self._seen)
+                logger.debug("%d of %d known copters answered", len(probed),
+                             len(self._seen))
+                if probe_callback:
+                    probe_callback(_to_uris(probed))
+                # A known copter that missed the single ping of the sweep
+                # is still in the result
+                found.update(probed)
+            for (link, devid) in self._sweep(radios):
+                found.setdefault(link, devid)
+        finally:
+            for (_, radio) in radios:
+                radio.close()
+        self.scan_time = time.time() - start
+        logger.info("Scan found %d copter(s) in %.2fs", len(found),
+                    self.scan_time)
+
+        self._seen.update(found.keys())
+        self._result = _to_uris(found.items())
+        self._result_time = time.time()
+        return list(self._result)
+
+    def _open_radios(self, skip_devids):
+        radios = []
+        devid = 0
+        while len(radios) < len(_DATARATES):
+            if devid not in skip_devids:
+                try:
+                    radio = self._radio_factory(devid)
+                except Exception:
+                    break
+                if self.trust_fw_scan:
+                    radio.trust_fw_scan = True
+                radio.set_arc(1)
+                radios.append((devid, radio))
+            devid += 1
+        return radios
+
+    def _probe(self, devid, radio, links):
+        """Probe the (channel, datarate) and return ((channel, datarate),
+        devid) for the ones that answer"""
+        selected = [{"channel": c, "datarate": dr} for (c, dr) in links]
+        found = radio.scan_selected(selected, (0xFF, 0xFF, 0xFF))
+        return [((s["channel"], s["datarate"]), devid) for s in found]
+
+    def _sweep(self, radios):
+        """Sweep all the channels at all data rates, the data rates are
+        spread on the dongles and swept in parallel. Returns
+        ((channel, datarate), devid) for the copters found"""
+        found = []
+        lock = threading.Lock()
+
+        def sweep_datarates(devid, radio, datarates):
+            for datarate in datarates:
+                radio.set_data_rate(datarate)
+                channels = radio.scan_channels(0, 125, (0xff,))
+                with lock:
+                    found.extend([((c, datarate), devid) for c in channels])
+
+        datarates = [dr for (dr, _) in _DATARATES]
+        threads = []
+        for (i, (devid, radio)) in enumerate(radios):
+            threads.append(threading.Thread(
+                target=sweep_datarates,
+                args=(devid, radio, datarates[i::len(radios)])))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return found
+
+
+def _to_uris(found):
+    """Convert ((channel, datarate), devid) to a sorted list of
+    [uri, description]. The URI uses the dongle that found the copter since
+    it was free when scanning, the dongles used by links are skipped"""
+    return [["radio://{}/{}/{}".format(devid, c, _datarate_string(dr)), ""]
+            for ((c, dr), devid) in sorted(found, key=_by_datarate)]
+
+
+def _by_datarate(found):
+    ((channel, datarate), _) = found
+    return (datarate, channel)
+
+
+def _datarate_string(datarate):
+    for (dr, name) in _DATARATES:
+        if dr == datarate:
+            return name
+    return ""
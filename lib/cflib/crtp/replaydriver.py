@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2011-2013 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+CRTP driver playing back a capture, see capture.
+
+URI format: replay://<capture file>[?speed=<factor>|max]
+
+The received packets of the capture are played back with their captured
+timing, scaled by the speed factor (1 by default), or as fast as they are
+read with max. To get the same exchange as when the capture was made a
+received packet is only played back once the client has sent the packets
+that had been sent before it in the capture (in any order), or after
+SYNC_TIMEOUT if the client doesn't. The client should start in the same
+state as when the capture was made, for instance with the same TOC cache.
+"""
+
+__author__ = 'Bitcraze AB'
+__all__ = ['ReplayDriver']
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .crtpdriver import CRTPDriver
+from .crtpstack import CRTPPacket
+from .exceptions import WrongUriType
+from .capture import read_capture, IN
+import collections
+import threading
+import Queue
+import re
+import time
+
+# Max time to wait for the client to send the packets expected before a
+# received packet, in seconds of wall-clock time (not scaled by the speed)
+SYNC_TIMEOUT = 0.5
+
+# Number of received packets played back after which a packet sent by the
+# client that has not matched the capture (setpoints, pings) is forgotten
+UNEXPECTED_AGE = 10
+
+
+class ReplayDriver(CRTPDriver):
+    """ Driver playing back a CRTP capture """
+
+    MULTIPLE_LINKS = True
+
+    def __init__(self):
+        CRTPDriver.__init__(self)
+        self.uri = ""
+        self.in_queue = None
+        self._thread = None
+
+    def connect(self, uri, link_quality_callback, link_error_callback):
+        if not re.search("^replay://", uri):
+            raise WrongUriType("Not a replay URI")
+
+        uri_data = re.search("^replay://([^?]+)(\\?speed=([0-9.]+|max))?$",
+                             uri)
+        if not uri_data:
+            raise WrongUriType("Wrong replay URI format!")
+
+        speed = 1.0
+        if uri_data.group(3) == "max":
+            speed = None
+        elif uri_data.group(3):
+            speed = float(uri_data.group(3))
+
+        (_, packets) = read_capture(uri_data.group(1))
+        self.uri = uri
+        self.in_queue = Queue.Queue()
+        self._thread = _ReplayThread(packets, speed, self.in_queue,
+                                     link_quality_callback)
+        self._thread.start()
+
+    def receive_packet(self, time=0):
+        try:
+            if time == 0:
+                data = self.in_queue.get(False)
+            elif time < 0:
+                data = self.in_queue.get(True)
+            else:
+                data = self.in_queue.get(True, time)
+        except Queue.Empty:
+            return None
+        return CRTPPacket(ord(data[0]), data[1:])
+
+    def send_packet(self, pk):
+        if self._thread:
+            self._thread.packet_sent(chr(pk.header) + pk.data)
+
+    def finished(self):
+        """Return True if all the received packets have been played
+        back"""
+        return self._thread is None or self._thread.finished
+
+    def close(self):
+        if self._thread:
+            self._thread.stop()
+            self._thread = None
+
+    def get_status(self):
+        return "Ok"
+
+    def get_name(self):
+        return "replay"
+
+    def scan_interface(self, full=False):
+        return []
+
+
+class _ReplayThread(threading.Thread):
+    """Queues the received packets of the capture when it's time"""
+
+    def __init__(self, packets, speed, in_queue, link_quality_callback):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self._packets = packets
+        self._speed = speed
+        self._in_queue = in_queue
+        self._link_quality_callback = link_quality_callback
+        self._condition = threading.Condition()
+        # Packets of the capture the client has not sent yet and packets the
+        # client has sent that are not (yet) expected, with the number of
+        # received packets played back when they were sent
+        self._missing = collections.defaultdict(int)
+        self._nbr_of_missing = 0
+        self._unexpected = collections.defaultdict(collections.deque)
+        self._nbr_of_played = 0
+        self._nbr_of_sent = 0
+        self._sp = False
+        self.finished = False
+
+    def packet_sent(self, data):
+        with self._condition:
+            self._nbr_of_sent += 1
+            if self._missing[data] > 0:
+                self._missing[data] -= 1
+                self._nbr_of_missing -= 1
+                self._condition.notify()
+            else:
+                self._unexpected[data].append(self._nbr_of_played)
+
+    def _expect(self, data):
+        with self._condition:
+            if self._unexpected.get(data):
+                self._unexpected[data].popleft()
+            else:
+                self._missing[data] += 1
+                self._nbr_of_missing += 1
+
+    def _played(self):
+        """Count a played back packet and forget the unexpected packets
+        that are too old to match the capture"""
+        self._nbr_of_played += 1
+        oldest = self._nbr_of_played - UNEXPECTED_AGE
+        for data in self._unexpected.keys():
+            sent = self._unexpected[data]
+            while sent and sent[0] < oldest:
+                sent.popleft()
+            if not sent:
+                del self._unexpected[data]
+
+    def stop(self):
+        with self._condition:
+            self._sp = True
+            self._condition.notify()
+
+    def run(self):
+        if self._link_quality_callback:
+            self._link_quality_callback(100)
+
+        start = time.time()
+        # Offset between the time of the capture and the replay, increased
+        # when waiting for the client
+        delay = 0
+        for (t, direction, pk) in self._packets:
+            if direction != IN:
+                self._expect(chr(pk.header) + pk.data)
+                continue
+
+            with self._condition:
+                sync_start = time.time()
+                while (not self._sp and self._nbr_of_missing > 0 and
+                        time.time() - sync_start < SYNC_TIMEOUT):
+                    self._condition.wait(SYNC_TIMEOUT)
+                if self._sp:
+                    return
+                if self._nbr_of_missing > 0:
+                    logger.debug("The client has not sent %d packet(s),"
+                                 " playing back %s anyway",
+                                 self._nbr_of_missing, pk)
+                    self._missing.clear()
+                    self._nbr_of_missing = 0
+                self._played()
+            if self._speed:
+                delay += time.time() - sync_start
+                wait = start + delay + t / self._speed - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                else:
+                    delay -= wait
+            self._in_queue.put(chr(pk.header) + pk.data)
+
+        self.finished = True
+        logger.info("Replay finished, %d packets sent by the client",
+                    self._nbr_of_sent)
@@ -27,79 +27,283 @@
 #  MA  02110-1301, USA.
 
 """ CRTP UDP Driver. Work either with the UDP server or with an UDP device
-See udpserver.py for the protocol"""
+See udpserver.py for the protocol
+
+Each datagram holds the CRTP header and data followed by a checksum byte,
+the sum of all the other bytes modulo 256. The control datagrams start with
+0xFF 0x01 (0x01 to connect and 0x02 to disconnect). When coalescing is
+enabled several CRTP packets are sent in one datagram starting with
+0xFF 0x02 where each packet is prefixed with its length.
+
+URI format: udp://[<host>][:<port>][/coalesce]
+"""
 
 __author__ = 'Bitcraze AB'
 __all__ = ['UdpDriver']
 
+import logging
+logger = logging.getLogger(__name__)
 
 from .crtpdriver import CRTPDriver
 from .crtpstack import CRTPPacket
 from .exceptions import WrongUriType
 import Queue
 import re
-import struct
-from socket import socket
+import socket
+import threading
+
+DEFAULT_HOST = "localhost"
+DEFAULT_PORT = 7777
+
+# Max number of received packets waiting to be read, more are dropped
+RX_QUEUE_SIZE = 1000
+# Max size of a datagram when coalescing packets
+MAX_DATAGRAM_SIZE = 512
+
+_CONNECT = "\xFF\x01\x01"
+_DISCONNECT = "\xFF\x01\x02"
+_COALESCED = "\xFF\x02"
+
+# Put in the out queue to stop the send thread
+_STOP = object()
+
+
+def _add_checksum(data):
+    """Return the data followed by its checksum"""
+    return data + chr(sum(bytearray(data)) & 0xFF)
+
+
+def _check_checksum(datagram):
+    """Return the data without the checksum, None if the checksum is
+    wrong"""
+    if len(datagram) < 2:
+        return None
+    body = bytearray(datagram)
+    if (sum(body) - 2 * body[-1]) & 0xFF != 0:
+        return None
+    return datagram[:-1]
 
 
 class UdpDriver(CRTPDriver):
     def __init__(self):
-        None
+        CRTPDriver.__init__(self)
+        self.socket = None
+        self.addr = None
+        self.in_queue = None
+        self.out_queue = None
+        self.coalesce = False
+        self.link_error_callback = None
+        self._receiver = None
+        self._sender = None
 
     def connect(self, uri, linkQualityCallback, linkErrorCallback):
         #check if the URI is a radio URI
         if not re.search("^udp://", uri):
             raise WrongUriType("Not an UDP URI")
 
-        self.queue = Queue.Queue()
-        self.socket = socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.addr = ("localhost", 7777)
+        uri_data = re.search("^udp://([^:/]+)?(:([0-9]+))?(/coalesce)?$",
+                             uri)
+        if not uri_data:
+            raise WrongUriType("Wrong UDP URI format!")
+
+        host = uri_data.group(1) or DEFAULT_HOST
+        port = DEFAULT_PORT
+        if uri_data.group(3):
+            port = int(uri_data.group(3))
+        self.coalesce = uri_data.group(4) is not None
+
+        self.link_error_callback = linkErrorCallback
+        self.in_queue = Queue.Queue(RX_QUEUE_SIZE)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addr = (host, port)
         self.socket.connect(self.addr)
 
-        #Add this to the server clients list
-        self.socket.sendto("\xFF\x01\x01\x01", self.addr)
+        self._receiver = _UdpReceiveThread(self.socket, self.in_queue,
+                                           linkErrorCallback)
+        self._receiver.start()
 
-    def receive_packet(self, time=0):
-        data, addr = self.socket.recvfrom(1024)
+        if self.coalesce:
+            # Limited size out queue to avoid "ReadBack" effect
+            self.out_queue = Queue.Queue(50)
+            self._sender = _UdpSendThread(self.socket, self.out_queue,
+                                          linkErrorCallback)
+            self._sender.start()
 
-        if data:
-            data = struct.unpack('b' * (len(data) - 1), data[0:len(data) - 1])
-            pk = CRTPPacket()
-            pk.port = data[0]
-            pk.data = data[1:]
-            return pk
+        #Add this to the server clients list
+        self.socket.send(_add_checksum(_CONNECT))
 
+    def receive_packet(self, time=0):
+        """
+        Receive a packet though the link. This call is blocking but will
+        timeout and return None if a timeout is supplied.
+        """
         try:
             if time == 0:
-                return self.rxqueue.get(False)
+                data = self.in_queue.get(False)
             elif time < 0:
-                while True:
-                    return self.rxqueue.get(True, 10)
+                data = self.in_queue.get(True)
             else:
-                return self.rxqueue.get(True, time)
+                data = self.in_queue.get(True, time)
         except Queue.Empty:
             return None
+        return CRTPPacket(ord(data[0]), data[1:])
 
     def send_packet(self, pk):
-        raw = (pk.port,) + struct.unpack("B"* len(pk.data), pk.data)
-
-        cksum = 0
-        for i in raw:
-            cksum += i
-
-        cksum %= 256
+        data = chr(pk.header) + pk.data
+        if self.coalesce:
+            try:
+                self.out_queue.put(data, True, 2)
+            except Queue.Full:
+                if self.link_error_callback:
+                    self.link_error_callback("UdpDriver: Could not send"
+                                             " packet")
+            return
 
-        data = ''.join(chr(v) for v in (raw + (cksum,)))
+        try:
+            self.socket.send(_add_checksum(data))
+        except socket.error as e:
+            if self.link_error_callback:
+                self.link_error_callback("UdpDriver: Could not send packet"
+                                         " ({})".format(e))
 
-        #print tuple(data)
-        self.socket.sendto(data, self.addr)
+    def get_dropped_packets(self):
+        """Get the number of received packets dropped because the queue
+        was full"""
+        if self._receiver:
+            return self._receiver.dropped
+        return 0
 
     def close(self):
-        #Remove this to the server clients list
-        self.socket.sendto("\xFF\x01\x02\x02", self.addr)
+        if self._sender:
+            self._sender.stop()
+            self._sender = None
+        try:
+            #Remove this to the server clients list
+            self.socket.send(_add_checksum(_DISCONNECT))
+        except socket.error:
+            pass
+        if self._receiver:
+            self._receiver.stop()
+            self._receiver = None
+        self.socket.close()
+        self.socket = None
 
     def get_name(self):
         return "udp"
 
-    def scan_interface(self):
+    def scan_interface(self, full=False):
         return []
+
+
+class _UdpReceiveThread(threading.Thread):
+    """Thread receiving the datagrams and queueing the CRTP packets"""
+
+    # Timeout of the socket, to check if the thread should stop
+    STOP_CHECK_PERIOD = 0.1
+
+    def __init__(self, sock, in_queue, link_error_callback):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self._socket = sock
+        self._in_queue = in_queue
+        self._link_error_callback = link_error_callback
+        self._sp = False
+        self.dropped = 0
+
+    def stop(self):
+        """ Stop the thread """
+        self._sp = True
+        try:
+            self.join()
+        except Exception:
+            pass
+
+    def run(self):
+        """ Run the receiver thread """
+        self._socket.settimeout(self.STOP_CHECK_PERIOD)
+        while not self._sp:
+            try:
+                datagram = self._socket.recv(4096)
+            except socket.timeout:
+                continue
+            except socket.error as e:
+                if self._sp:
+                    break
+                if self._link_error_callback:
+                    self._link_error_callback("Error communicating with the"
+                                              " UDP link\nException:"
+                                              "%s" % e)
+                break
+
+            data = _check_checksum(datagram)
+            if data is None:
+                logger.warning("Dropping UDP datagram with bad checksum")
+                continue
+
+            if data.startswith(_COALESCED):
+                i = len(_COALESCED)
+                while i < len(data):
+                    length = ord(data[i])
+                    packet = data[i + 1:i + 1 + length]
+                    if len(packet) != length:
+                        logger.warning("Dropping truncated packet in UDP"
+                                       " datagram")
+                        break
+                    # An empty entry has no CRTP header, skip it
+                    if length > 0:
+                        self._queue(packet)
+                    i += 1 + length
+            elif len(data) > 0:
+                self._queue(data)
+
+    def _queue(self, data):
+        try:
+            self._in_queue.put_nowait(data)
+        except Queue.Full:
+            self.dropped += 1
+
+
+class _UdpSendThread(threading.Thread):
+    """Thread sending the queued CRTP packets, the packets that are queued
+    while a datagram is sent are coalesced into the next one"""
+
+    def __init__(self, sock, out_queue, link_error_callback):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self._socket = sock
+        self._out_queue = out_queue
+        self._link_error_callback = link_error_callback
+
+    def stop(self):
+        """ Stop the thread """
+        self._out_queue.put(_STOP)
+        try:
+            self.join()
+        except Exception:
+            pass
+
+    def run(self):
+        data = self._out_queue.get(True)
+        while data is not _STOP:
+            datagram = [_COALESCED]
+            # The size includes the checksum
+            size = len(_COALESCED) + 1
+            while (data is not None and data is not _STOP and
+                    size + 1 + len(data) <= MAX_DATAGRAM_SIZE):
+                datagram.append(chr(len(data)))
+                datagram.append(data)
+                size += 1 + len(data)
+                try:
+                    data = self._out_queue.get(False)
+                except Queue.Empty:
+                    data = None
+
+            try:
+                self._socket.send(_add_checksum("".join(datagram)))
+            except socket.error as e:
+                if self._link_error_callback:
+                    self._link_error_callback("UdpDriver: Could not send"
+                                              " packet ({})".format(e))
+
+            if data is None:
+                data = self._out_queue.get(True)
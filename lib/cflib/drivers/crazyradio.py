@@ -106,6 +106,9 @@ class Crazyradio:
     P_M6DBM = 2
     P_0DBM = 3
 
+    # Set to True to use the fast firmware-driven scan
+    trust_fw_scan = False
+
     def __init__(self, device=None, devid=0):
         """ Create object and scan for USB dongle if no device is supplied """
         if device is None:
@@ -209,9 +212,9 @@ class Crazyradio:
             _send_vendor_setup(self.handle, SET_CONT_CARRIER, 0, 0, ())
 
     def _has_fw_scan(self):
-        #return self.version >= 0.5
-        # FIXME: Mitigation for Crazyradio firmware bug #9
-        return False
+        # FIXME: Mitigation for Crazyradio firmware bug #9, the firmware scan
+        # is only used when the firmware is known to be good
+        return self.trust_fw_scan and self.version >= 0.5
 
     def scan_selected(self, selected, packet):
         result = ()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2011-2013 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Fake Crazyradio backend for testing without hardware.
+
+A FakeRadioBackend simulates the air with a number of dongles and copters.
+The copters are found on a channel, data rate and address and echo back the
+packets they receive. Use create_radio as the radio factory of a
+RadioManager.
+"""
+
+__author__ = 'Bitcraze AB'
+__all__ = ['FakeRadioBackend', 'FakeCrazyradio', 'FakeCopter']
+
+import collections
+import threading
+import time
+
+from .crazyradio import Crazyradio
+
+
+class _radio_ack:
+    ack = False
+    powerDet = False
+    retry = 0
+    data = ()
+
+
+class FakeCopter():
+    """A copter that answers the packets it receives"""
+
+    def __init__(self, echo=True):
+        self.echo = echo
+        self.received = []
+        self._to_send = collections.deque()
+
+    def queue_packet(self, data):
+        """Queue data (header and payload) to be sent back in an ack"""
+        self._to_send.append(tuple(data))
+
+    def handle_packet(self, data):
+        """Handle the data sent by a dongle and return the ack payload"""
+        data = tuple(data)
+        if data != (0xFF,):
+            self.received.append(data)
+            if self.echo:
+                self._to_send.append(data)
+        if self._to_send:
+            return self._to_send.popleft()
+        return ()
+
+
+class FakeRadioBackend():
+    """The dongles and copters of a simulated setup"""
+
+    def __init__(self, nbr_of_dongles=1, transaction_time=0.0005):
+        self.nbr_of_dongles = nbr_of_dongles
+        # Simulated duration of a radio transaction
+        self.transaction_time = transaction_time
+        self._copters = {}
+        self._lock = threading.Lock()
+
+    def add_copter(self, channel, datarate=Crazyradio.DR_2MPS,
+                   address=(0xE7,) * 5, copter=None):
+        """Put a copter in the air, returns the copter"""
+        if copter is None:
+            copter = FakeCopter()
+        self._copters[(channel, datarate, tuple(address))] = copter
+        return copter
+
+    def get_copter(self, channel, datarate, address):
+        return self._copters.get((channel, datarate, tuple(address)))
+
+    def create_radio(self, devid=0):
+        """Create the radio for a dongle, usable as radio factory"""
+        if devid >= self.nbr_of_dongles:
+            raise Exception("Cannot find a Crazyradio Dongle")
+        return FakeCrazyradio(self, devid)
+
+
+class FakeCrazyradio():
+    """Used in place of a Crazyradio to talk to fake copters"""
+    DR_250KPS = Crazyradio.DR_250KPS
+    DR_1MPS = Crazyradio.DR_1MPS
+    DR_2MPS = Crazyradio.DR_2MPS
+
+    trust_fw_scan = False
+
+    def __init__(self, backend, devid=0):
+        self._backend = backend
+        self.devid = devid
+        self.version = 0.5
+        self.arc = 3
+        self.channel = 2
+        self.datarate = self.DR_2MPS
+        self.address = (0xE7,) * 5
+        # Number of times the radio has been reconfigured
+        self.nbr_of_config_changes = 0
+        self.nbr_of_transactions = 0
+
+    def close(self):
+        pass
+
+    def set_channel(self, channel):
+        self.channel = channel
+        self.nbr_of_config_changes += 1
+
+    def set_address(self, address):
+        if len(address) != 5:
+            raise Exception("Crazyradio: the radio address shall be 5"
+                            " bytes long")
+        self.address = tuple(address)
+        self.nbr_of_config_changes += 1
+
+    def set_data_rate(self, datarate):
+        self.datarate = datarate
+        self.nbr_of_config_changes += 1
+
+    def set_power(self, power):
+        pass
+
+    def set_arc(self, arc):
+        self.arc = arc
+
+    def set_ard_time(self, us):
+        pass
+
+    def set_ard_bytes(self, nbytes):
+        pass
+
+    def set_cont_carrier(self, active):
+        pass
+
+    def scan_selected(self, selected, packet):
+        result = ()
+        for s in selected:
+            self.set_channel(s["channel"])
+            self.set_data_rate(s["datarate"])
+            status = self.send_packet(packet)
+            if status and status.ack:
+                result = result + (s,)
+        return result
+
+    def scan_channels(self, start, stop, packet):
+        if self.trust_fw_scan:
+            # The firmware scan is done in one USB request
+            time.sleep(self._backend.transaction_time)
+            return tuple([c for c in range(start, stop + 1)
+                          if self._backend.get_copter(c, self.datarate,
+                                                      self.address)])
+        result = tuple()
+        for i in range(start, stop + 1):
+            self.set_channel(i)
+            status = self.send_packet(packet)
+            if status and status.ack:
+                result = result + (i,)
+        return result
+
+    def send_packet(self, dataOut):
+        if self._backend.transaction_time:
+            time.sleep(self._backend.transaction_time)
+        self.nbr_of_transactions += 1
+
+        ackIn = _radio_ack()
+        copter = self._backend.get_copter(self.channel, self.datarate,
+                                          self.address)
+        if copter is None:
+            ackIn.retry = self.arc
+            return ackIn
+
+        ackIn.ack = True
+        with self._backend._lock:
+            ackIn.data = copter.handle_packet(dataOut)
+        return ackIn
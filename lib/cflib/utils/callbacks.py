@@ -52,5 +52,6 @@ class Caller():
 
     def call(self, *args):
         """ Call the callbacks registered with the arguments args """
-        for cb in self.callbacks:
+        # Iterate over a copy so that callbacks can remove themselves
+        for cb in list(self.callbacks):
             cb(*args)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#     ||          ____  _ __
+#  +------+      / __ )(_) /_______________ _____  ___
+#  | 0xBC |     / __  / / __/ ___/ ___/ __ `/_  / / _ \
+#  +------+    / /_/ / / /_/ /__/ /  / /_/ / / /_/  __/
+#   ||  ||    /_____/_/\__/\___/_/   \__,_/ /___/\___/
+#
+#  Copyright (C) 2014 Bitcraze AB
+#
+#  Crazyflie Nano Quadcopter Client
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software
+#  Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#  MA  02110-1301, USA.
+
+"""
+Thread writing buffered data to a file.
+"""
+
+__author__ = 'Bitcraze AB'
+__all__ = ['FileWriterThread']
+
+import threading
+
+
+class FileWriterThread(threading.Thread):
+    """Periodically writes the strings appended to a deque to a file, the
+    remaining ones are written when the thread is stopped"""
+
+    def __init__(self, f, records, flush_period):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self._file = f
+        self._records = records
+        self._flush_period = flush_period
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """Write the remaining records and stop the thread"""
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._stop_event.wait(self._flush_period)
+            self._write()
+        # Records added after the last write in the loop
+        self._write()
+
+    def _write(self):
+        chunks = []
+        try:
+            while True:
+                chunks.append(self._records.popleft())
+        except IndexError:
+            pass
+        if chunks:
+            self._file.write("".join(chunks))
+            self._file.flush()